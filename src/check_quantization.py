@@ -0,0 +1,93 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.feature_engineering.categories import get_closest_categories, get_embeddings
+from src.feature_engineering.config import CATEGORY_EMBEDDINGS_PATH
+from src.manifestos.retrieval import read_index
+from src.prediction.config import SIMILARITY_K
+from src.utils import vectors
+from src.votes.config import OUTPUT_PARQUET_PATH
+
+# (quantization, dimensions) representations compared against float32
+VARIANTS = [("int8", None), (None, 512), ("int8", 512), ("int8", 256)]
+
+
+def retrieval_recall(
+    index: pd.DataFrame,
+    queries: np.ndarray,
+    quantization: str | None,
+    dimensions: int | None,
+    k: int,
+) -> float:
+    """
+    Mean share of the top `k` manifesto chunks at full precision that are also
+    retrieved in the given representation, over all manifestos and queries.
+    """
+    recalls = []
+    for _, chunks in index.groupby(["party", "year"]):
+        matrix = vectors.to_matrix(chunks["embedding"])
+        full = vectors.top_k(queries, vectors.search_matrix(matrix, None, None), k)
+        reduced = vectors.top_k(
+            queries, vectors.search_matrix(matrix, quantization, dimensions), k
+        )
+        recalls += [
+            len(set(f) & set(r)) / len(f) for f, r in zip(full, reduced) if len(f)
+        ]
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def check_quantization(
+    min_recall: float, min_agreement: float, max_queries: int, k: int = SIMILARITY_K
+) -> bool:
+    # compares existing artifacts only, nothing is embedded or built
+    if not Path(CATEGORY_EMBEDDINGS_PATH).exists():
+        raise FileNotFoundError(
+            f"Category embeddings {CATEGORY_EMBEDDINGS_PATH} not found, run the prediction first."
+        )
+    index = read_index()
+    summaries = vectors.read_embedding_matrix(OUTPUT_PARQUET_PATH, "summary_embedding")
+    categories = get_embeddings()
+    full_categories = get_closest_categories(summaries, categories, None, None)
+    rng = np.random.default_rng(0)
+    queries = summaries[
+        np.sort(rng.choice(len(summaries), min(max_queries, len(summaries)), replace=False))
+    ]
+    # the manifesto chunks are the largest matrix that is stored quantized
+    chunks = vectors.to_matrix(index["embedding"])
+    full_bytes = vectors.search_matrix(chunks, None, None).nbytes
+
+    ok = True
+    for quantization, dimensions in VARIANTS:
+        name = f"{quantization or 'float32'}/{dimensions or chunks.shape[1]}d"
+        agreement = float(
+            np.mean(
+                get_closest_categories(summaries, categories, quantization, dimensions)
+                == full_categories
+            )
+        )
+        recall = retrieval_recall(index, queries, quantization, dimensions, k)
+        size = vectors.search_matrix(chunks, quantization, dimensions).nbytes / full_bytes
+        passed = recall >= min_recall and agreement >= min_agreement
+        ok &= passed
+        print(
+            f"{'OK  ' if passed else 'FAIL'} {name}: category agreement {agreement:.3f}, "
+            f"recall@{k} {recall:.3f}, {size:.1%} of the float32 size"
+        )
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare quantized and truncated embeddings against full precision."
+    )
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument(
+        "--max-queries", type=int, default=1000, help="Vote summaries used as retrieval queries."
+    )
+    args = parser.parse_args()
+    sys.exit(0 if check_quantization(args.min_recall, args.min_agreement, args.max_queries) else 1)
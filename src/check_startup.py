@@ -0,0 +1,72 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# seconds an entry point may take to import, and heavy packages it must not
+# import before they are needed
+STARTUP_BUDGETS = {
+    "src.run_preprocessing": 3.0,
+    "src.run_prediction": 3.0,
+    "src.run_training": 1.5,
+    "src.run_predict_passage": 1.5,
+    "src.run_build_index": 3.0,
+}
+LAZY_PACKAGES = {
+    "src.run_preprocessing": ["langchain", "xgboost", "sklearn"],
+    "src.run_prediction": ["langchain", "xgboost", "sklearn"],
+    "src.run_training": ["openai", "langchain", "xgboost", "sklearn"],
+    "src.run_predict_passage": ["openai", "langchain", "sklearn"],
+    "src.run_build_index": ["langchain", "xgboost", "sklearn"],
+}
+
+
+def measure(module: str, runs: int) -> tuple[float, list[str]]:
+    """
+    Imports `module` in fresh interpreters and returns the fastest import time in
+    seconds and the top-level packages loaded by the import.
+    """
+    code = (
+        "import json, sys, time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))"
+    )
+    timings, modules = [], []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        elapsed, modules = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(elapsed)
+    return min(timings), sorted({m.split(".")[0] for m in modules})
+
+
+def check_startup(runs: int = 3) -> bool:
+    ok = True
+    for module, budget in STARTUP_BUDGETS.items():
+        started = time.perf_counter()
+        try:
+            elapsed, packages = measure(module, runs)
+        except subprocess.CalledProcessError as e:
+            print(f"FAIL {module}: import failed\n{e.stderr}")
+            ok = False
+            continue
+        eager = [p for p in LAZY_PACKAGES.get(module, []) if p in packages]
+        passed = elapsed <= budget and not eager
+        ok &= passed
+        print(
+            f"{'OK  ' if passed else 'FAIL'} {module}: {elapsed:.2f}s of {budget:.1f}s"
+            + (f", imports {', '.join(eager)} eagerly" if eager else "")
+            + f" (checked in {time.perf_counter() - started:.1f}s)"
+        )
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the import time of the entry points against their budgets."
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Imports per entry point.")
+    args = parser.parse_args()
+    sys.exit(0 if check_startup(args.runs) else 1)
@@ -1,2 +1,52 @@
 PARTIES = ["AfD", "DIE_GRÜNEN", "DIE_LINKE", "FDP", "SPD", "Union"]
 EMBEDDING_MODEL = "text-embedding-3-small"
+
+PDF_CACHE_DIR = "data/cache/pdf"
+
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_REQUESTS_PER_SECOND = 4.0
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_MANIFEST_PATH = "data/download_manifest.jsonl"
+
+EMBEDDING_CACHE_DIR = "data/cache/embeddings"
+# inputs and estimated tokens per embedding request, and concurrent requests
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_BATCH_TOKENS = 250_000
+EMBEDDING_WORKERS = 4
+# representation of the searched embeddings, the manifesto chunks and the category
+# vectors: None keeps float32, "int8" stores int8 codes with a scale per vector.
+# Vote summary embeddings are only used as queries and stay float32. Embeddings can
+# additionally be truncated to their first EMBEDDING_SEARCH_DIMENSIONS dimensions
+EMBEDDING_QUANTIZATION = None
+EMBEDDING_SEARCH_DIMENSIONS = None
+# rows of a quantized matrix that are expanded to float32 at once while searching
+QUANTIZED_BLOCK_ROWS = 16_384
+
+LLM_CACHE_DIR = "data/cache/llm"
+
+# in-flight llm requests per provider start at the initial value and adapt up to the maximum
+LLM_INITIAL_CONCURRENCY = 4
+LLM_MAX_CONCURRENCY = {"openai": 64, "deepseek": 32, "anthropic": 16}
+LLM_TOKENS_PER_MINUTE = {"openai": 2_000_000, "deepseek": 1_000_000, "anthropic": 400_000}
+LLM_MAX_RETRIES = 5
+# retries of the provider sdks for calls outside the dispatcher, which retries itself
+LLM_CLIENT_MAX_RETRIES = 2
+
+# "openai" submits batch jobs to the openai batch api, "local" to the file-based
+# stand-in, which answers them with regular requests to the provider
+BATCH_BACKEND = "openai"
+BATCH_DIR = "data/batches"
+LOCAL_BATCH_DIR = "data/batches/local"
+BATCH_POLL_INTERVAL = 60
+# the openai completion window is 24 hours
+BATCH_TIMEOUT = 25 * 60 * 60
+
+# answers of the offline stand-in for the llm apis, see src/utils/llm/offline.py
+OFFLINE_CASSETTE_DIR = "data/cassettes"
+OFFLINE_LATENCY = 0.5
+OFFLINE_LATENCY_JITTER = 0.5
+OFFLINE_TOKEN_LATENCY = 0.01
+OFFLINE_MAX_CONCURRENCY = None
+OFFLINE_EMBEDDING_DIMENSIONS = 1536
+OFFLINE_ANSWER_WORDS = 40
@@ -1,46 +1,142 @@
+from functools import cache
 from pathlib import Path
+from typing import Iterable, Iterator
 
 from loguru import logger
 
+from src.drucksachen import config
 from src.utils import pdf
-from src.utils.download import download_file
+from src.utils.archive import PackedArchive
+from src.utils.download import (
+    download_file,
+    download_files,
+    ensure_validated,
+    path_lock,
+)
+
+
+@cache
+def get_archive() -> PackedArchive:
+    return PackedArchive(config.PACKED_ARCHIVE_PATH)
+
+
+def _archive_key(drucksachen_id: str) -> str:
+    return drucksachen_id.replace("/", "_")
 
 
 def get_drucksache_path(drucksachen_id: str) -> str:
-    return f"data/drucksachen/{drucksachen_id.replace('/', '_')}.pdf"
+    return f"{config.PDF_FOLDER}/{_archive_key(drucksachen_id)}.pdf"
 
 
-def assert_drucksache_download(drucksachen_id: str):
-    Path("data/drucksachen").mkdir(parents=True, exist_ok=True)
-    filename = get_drucksache_path(drucksachen_id)
-    if Path(filename).exists():
-        return
+def get_drucksache_url(drucksachen_id: str) -> str:
     bundestag_number, vote_number = drucksachen_id.split("/")
     zeroes_to_add = max(0, 5 - len(vote_number))
     vote_number = f"{'0' * zeroes_to_add}{vote_number}"
-    url = f"https://dserver.bundestag.de/btd/{bundestag_number}/{vote_number[:3]}/{bundestag_number}{vote_number}.pdf"
-    download_file(url, filename)
-    try:
-        pdf.extract_content(filename)
-    except Exception as e:
-        logger.error(f"File {filename} corrupted: {e}")
-        Path(filename).unlink(missing_ok=True)
-        raise e
+    return f"https://dserver.bundestag.de/btd/{bundestag_number}/{vote_number[:3]}/{bundestag_number}{vote_number}.pdf"
+
+
+def is_downloaded(drucksachen_id: str) -> bool:
+    if config.STORAGE_BACKEND == "packed":
+        return _archive_key(drucksachen_id) in get_archive()
+    return Path(get_drucksache_path(drucksachen_id)).exists()
+
+
+def assert_drucksache_download(drucksachen_id: str):
+    Path(config.PDF_FOLDER).mkdir(parents=True, exist_ok=True)
+    if is_downloaded(drucksachen_id):
+        return
+    filename = get_drucksache_path(drucksachen_id)
+    # drucksachen shared by several votes are asked for by several threads at once
+    with path_lock(filename):
+        if is_downloaded(drucksachen_id):
+            return
+        download_file(get_drucksache_url(drucksachen_id), filename)
+        try:
+            ensure_validated(filename)
+        except Exception as e:
+            logger.error(f"File {filename} corrupted: {e}")
+            Path(filename).unlink(missing_ok=True)
+            raise e
+        if config.STORAGE_BACKEND == "packed":
+            get_archive().add(_archive_key(drucksachen_id), Path(filename).read_bytes())
+            Path(filename).unlink()
+
+
+def download_drucksachen(drucksachen_ids: Iterable[str], refresh: bool = False) -> list[str]:
+    """
+    Downloads all missing drucksachen concurrently. With `refresh`, drucksachen
+    already on disk are revalidated with a conditional GET and replaced if they
+    changed; drucksachen in a packed archive are kept as they are.
+
+    Returns:
+        The IDs that could not be downloaded.
+    """
+    Path(config.PDF_FOLDER).mkdir(parents=True, exist_ok=True)
+    ids = list(dict.fromkeys(drucksachen_ids))
+    missing = [i for i in ids if not is_downloaded(i)]
+    targets = ids if refresh and config.STORAGE_BACKEND != "packed" else missing
+    failures = download_files(
+        ((get_drucksache_url(i), get_drucksache_path(i)) for i in targets),
+        refresh=refresh,
+    )
+    failed = [i for i in targets if get_drucksache_path(i) in failures]
+    if config.STORAGE_BACKEND == "packed":
+        for drucksachen_id in missing:
+            if drucksachen_id in failed:
+                continue
+            try:
+                assert_drucksache_download(drucksachen_id)
+            except Exception:
+                failed.append(drucksachen_id)
+    return failed
+
+
+def get_drucksache_source(drucksachen_id: str) -> str | bytes:
+    """
+    Downloads the drucksache with the given ID if necessary and returns what
+    `src.utils.pdf` needs to open it: the file path, or the pdf bytes read from
+    the packed archive.
+    """
+    assert_drucksache_download(drucksachen_id)
+    if config.STORAGE_BACKEND == "packed":
+        return get_archive().get(_archive_key(drucksachen_id))
+    return get_drucksache_path(drucksachen_id)
+
+
+def get_drucksache_hash(drucksachen_id: str) -> str:
+    """
+    Returns the sha256 of the drucksache pdf, downloading it if necessary.
+    """
+    return pdf.file_hash(get_drucksache_source(drucksachen_id))
+
+
+def import_drucksachen_files() -> int:
+    """
+    Imports the per-file layout in `config.PDF_FOLDER` into the packed archive.
+    """
+    return get_archive().import_directory(config.PDF_FOLDER)
 
 
 def get_drucksache(drucksachen_id: str, opt="text", first_page_only=False) -> str:
     """
-    Downloads the drucksache with the given ID and returns the path to the downloaded file.
+    Downloads the drucksache with the given ID and returns its content.
 
     Args:
         drucksachen_id (str): The ID of the drucksache to download.
 
     Returns:
-        str: The path to the downloaded file.
+        str: The content of the drucksache, as text or list of blocks depending on `opt`.
     """
-    path = get_drucksache_path(drucksachen_id)
-    assert_drucksache_download(drucksachen_id)
+    source = get_drucksache_source(drucksachen_id)
 
     if first_page_only:
-        return pdf.extract_first_page(path, opt)
-    return pdf.extract_content(path, opt)
+        return pdf.read_first_page(source, opt)
+    return pdf.read_content(source, opt)
+
+
+def iter_drucksache_blocks(drucksachen_id: str) -> Iterator[tuple]:
+    """
+    Downloads the drucksache with the given ID if necessary and lazily yields its
+    y-sorted blocks page by page.
+    """
+    return pdf.iter_blocks(get_drucksache_source(drucksachen_id))
@@ -3,14 +3,14 @@ from typing import TypedDict
 
 from loguru import logger
 
-from src.drucksachen.access import get_drucksache
+from src.drucksachen.access import iter_drucksache_blocks
 from src.drucksachen.parse import extract_title_from_drucksache
 from src.enums import VoteResultEnum
 from src.utils import regex
 
 
 def get_content(drucksache_id: str) -> str | None:
-    blocks = get_drucksache(drucksache_id, opt="blocks")
+    blocks = iter_drucksache_blocks(drucksache_id)
     started, buf = False, []
     for block in blocks:
         text = block[4].strip()
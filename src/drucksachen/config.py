@@ -0,0 +1,4 @@
+# "files" keeps every drucksache as its own pdf, "packed" stores them in one archive
+STORAGE_BACKEND = "files"
+PDF_FOLDER = "data/drucksachen"
+PACKED_ARCHIVE_PATH = "data/drucksachen.pack"
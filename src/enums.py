@@ -8,4 +8,5 @@ class VoteResultEnum(Enum):
 
 class APIProviderEnum(Enum):
     OPENAI = "openai"
-    DEEPSEEK = "deepseek"
\ No newline at end of file
+    DEEPSEEK = "deepseek"
+    ANTHROPIC = "anthropic"
@@ -4,8 +4,10 @@ import numpy as np
 import pandas as pd
 from loguru import logger
 
+from src.config import EMBEDDING_QUANTIZATION, EMBEDDING_SEARCH_DIMENSIONS
 from src.feature_engineering import config
-from src.utils.llm.openai_client import get_embedding
+from src.utils import vectors
+from src.utils.llm.embeddings import embed_texts
 
 
 def get_embeddings() -> pd.DataFrame:
@@ -19,20 +21,51 @@ def get_embeddings() -> pd.DataFrame:
                 "category": config.CATEGORIES,
             }
         )
-        categories["embedding"] = categories["category"].apply(get_embedding)
-        categories.to_parquet(config.CATEGORY_EMBEDDINGS_PATH, index=False)
+        categories["embedding"] = embed_texts(categories["category"].tolist())
+        Path(config.CATEGORY_EMBEDDINGS_PATH).parent.mkdir(parents=True, exist_ok=True)
+        vectors.write_parquet(
+            categories, config.CATEGORY_EMBEDDINGS_PATH, embedding_columns=["embedding"]
+        )
     return categories
 
 
-def get_closest_category(summary_embedding: np.array, categories: pd.DataFrame) -> str:
-    distances = categories["embedding"].apply(
-        lambda x: np.linalg.norm(np.array(x) - summary_embedding)
+def get_closest_categories(
+    summary_embeddings: np.ndarray,
+    categories: pd.DataFrame,
+    quantization: str | None = EMBEDDING_QUANTIZATION,
+    dimensions: int | None = EMBEDDING_SEARCH_DIMENSIONS,
+) -> np.ndarray:
+    """
+    Returns the category with the smallest euclidean distance for every row of an
+    (n, dim) embedding matrix. With a quantization or truncated dimensions the
+    category embeddings are searched in that representation instead, ranked by
+    cosine similarity, which for unit-length embeddings is the same order. The
+    summaries are the queries and are not copied or quantized.
+    """
+    category_matrix = vectors.to_matrix(categories["embedding"])
+    if quantization is not None or dimensions is not None:
+        searched = vectors.search_matrix(category_matrix, quantization, dimensions)
+        scores = vectors.similarities(summary_embeddings, searched)
+        return categories["category"].to_numpy()[scores.argmax(axis=1)]
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2ab, without materializing all differences
+    distances = (
+        (summary_embeddings**2).sum(axis=1)[:, None]
+        + (category_matrix**2).sum(axis=1)[None, :]
+        - 2 * summary_embeddings @ category_matrix.T
     )
-    closest_index = distances.idxmin()
-    return categories.iloc[closest_index]["category"]
+    return categories["category"].to_numpy()[distances.argmin(axis=1)]
+
+
+def get_closest_category(summary_embedding: np.array, categories: pd.DataFrame) -> str:
+    return get_closest_categories(
+        vectors.to_matrix([summary_embedding]), categories
+    )[0]
 
 
 def get_category_column(embeddings: pd.Series) -> pd.Series:
     logger.info("Calculating closest categories through embeddings")
     categories = get_embeddings()
-    return embeddings.apply(lambda x: get_closest_category(np.array(x), categories))
+    return pd.Series(
+        get_closest_categories(vectors.to_matrix(embeddings), categories),
+        index=embeddings.index,
+    )
@@ -1,11 +1,18 @@
 from datetime import datetime
+from functools import cache
 from loguru import logger
 import pandas as pd
 
-manifesto_metadata = pd.read_csv(r"input\manifestos.csv")
-manifesto_metadata["term_start"] = pd.to_datetime(manifesto_metadata["term_start"], format="%d.%m.%Y")
+
+@cache
+def get_manifesto_metadata() -> pd.DataFrame:
+    manifesto_metadata = pd.read_csv("input/manifestos.csv")
+    manifesto_metadata["term_start"] = pd.to_datetime(manifesto_metadata["term_start"], format="%d.%m.%Y")
+    return manifesto_metadata
+
 
 def get_legislature_period_metadata(party: str, date: datetime) -> dict:
+    manifesto_metadata = get_manifesto_metadata()
     party_rows = manifesto_metadata[
         (manifesto_metadata["party"] == party)
         & (manifesto_metadata["term_start"] <= date)
@@ -2,7 +2,7 @@ import pandas as pd
 
 from src import config
 from src.enums import VoteResultEnum
-from src.votes.config import RESULT_CSV_FOLDER
+from src.votes.result_store import get_result_store
 
 
 def vote_counts_to_result(votes: pd.Series) -> str:
@@ -29,7 +29,7 @@ def flip_vote_result(vote_result: str) -> str:
 
 
 def build_party_df(party: str) -> pd.DataFrame:
-    df = pd.read_csv(f"{RESULT_CSV_FOLDER}/{party}.csv")
+    df = get_result_store().load(party)
     df["ground_truth"] = df.apply(vote_counts_to_result, axis=1)
     df["party"] = party
     sums = df[["Annahme", "Ablehnung", "Enthaltung"]].sum(axis=1)
@@ -1 +1,12 @@
 CLEANED_PARQUET_PATH = "output/cleaned_manifestos.parquet"
+SUMMARY_MODEL = "gpt-4.1-mini"
+
+# manifestos above this many tokens are summarized in chunks which are merged afterwards
+SUMMARY_CHUNK_TOKENS = 32_000
+
+# chunks of the manifesto summaries that votes are matched against
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+# chunk texts and embeddings of all manifestos, rebuilt per manifesto when its summary changes
+INDEX_PARQUET_PATH = "data/manifestos/index.parquet"
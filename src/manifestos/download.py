@@ -6,8 +6,14 @@ from tqdm import tqdm
 
 from src.manifestos import config
 from src.utils import pdf
-from src.utils.download import download_file
-from src.utils.llm import openai_client, prompts
+from src.utils.download import download_file, download_files
+from src.enums import APIProviderEnum
+from src.utils.llm import prompts
+from src.utils.llm.mapreduce import summarize_long
+
+
+def get_manifesto_path(party: str, year: int) -> str:
+    return f"data/manifestos/pdf/{party}_{year}.pdf"
 
 
 def download_manifestos():
@@ -23,11 +29,20 @@ def download_manifestos():
         )
     )
 
+    missing = manifestos.merge(
+        already_downloaded[["party", "year"]], on=["party", "year"], how="left", indicator=True
+    ).query("_merge == 'left_only'")
+    download_files(
+        (row["url"], get_manifesto_path(row["party"], row["year"]))
+        for _, row in missing.iterrows()
+    )
+
     output = []
+    new_manifestos = []
 
     with tqdm(
         total=len(manifestos),
-        desc="Downloading and summarizing manifestos",
+        desc="Downloading manifestos",
         unit="manifesto",
     ) as pbar:
         for _, row in manifestos.iterrows():
@@ -41,7 +56,7 @@ def download_manifestos():
                     f"Manifesto for {row['party']} {row['year']} already downloaded. Skipping."
                 )
                 continue
-            local_path = f"data/manifestos/pdf/{row['party']}_{row['year']}.pdf"
+            local_path = get_manifesto_path(row["party"], row["year"])
             try:
                 download_file(row["url"], local_path)
             except RuntimeError:
@@ -49,20 +64,38 @@ def download_manifestos():
                     f"Failed to download manifesto for {row['party']} {row['year']}. URL: {row['url']}"
                 )
                 continue
-            content = pdf.extract_content(local_path)
-            summarized = openai_client.prompt_openai(
-                system_prompt=prompts.SUMMARIZE_MANIFESTO, text=content
-            )
-            output.append(
+            new_manifestos.append(
                 {
                     "party": row["party"],
                     "year": row["year"],
-                    "summary": summarized,
-                    "raw_text": content,
+                    "raw_text": pdf.extract_content(local_path),
                     "valid_starting": row["valid_starting"],
                 }
             )
 
+    logger.info(f"Summarizing {len(new_manifestos)} manifestos.")
+    summaries = summarize_long(
+        [manifesto["raw_text"] for manifesto in new_manifestos],
+        APIProviderEnum.OPENAI,
+        config.SUMMARY_MODEL,
+        prompts.SUMMARIZE_MANIFESTO,
+        max_tokens=config.SUMMARY_CHUNK_TOKENS,
+        prefix="manifestos",
+    )
+    for manifesto, summary in zip(new_manifestos, summaries):
+        if summary is None:
+            logger.error(f"Failed to summarize manifesto for {manifesto['party']} {manifesto['year']}.")
+            continue
+        output.append(
+            {
+                "party": manifesto["party"],
+                "year": manifesto["year"],
+                "summary": summary,
+                "raw_text": manifesto["raw_text"],
+                "valid_starting": manifesto["valid_starting"],
+            }
+        )
+
     logger.info(f"Saving cleaned manifestos to parquet file at {output_path}.")
     df = pd.DataFrame(output)
     df.to_parquet(output_path, index=False)
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import time
+from functools import cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from src.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_QUANTIZATION,
+    EMBEDDING_SEARCH_DIMENSIONS,
+    PARTIES,
+)
+from src.manifestos import config
+from src.manifestos.embed import get_splitter
+from src.utils import vectors
+from src.utils.llm.embeddings import embed_texts
+
+INDEX_COLUMNS = [
+    "index_version",
+    "party",
+    "year",
+    "summary_hash",
+    "chunk_index",
+    "chunk",
+    "embedding",
+]
+
+
+class ManifestoIndex:
+    """
+    The chunks of one manifesto with their unit-length embeddings in one float32
+    or quantized matrix, see `vectors.search_matrix`. The index keeps no reference
+    to `matrix`. A whole batch of queries is answered with a single matrix multiply.
+    """
+
+    def __init__(
+        self,
+        chunks: list[str],
+        matrix: np.ndarray,
+        quantization: str | None = EMBEDDING_QUANTIZATION,
+        dimensions: int | None = EMBEDDING_SEARCH_DIMENSIONS,
+    ):
+        self.chunks = chunks
+        self.matrix = vectors.search_matrix(vectors.to_matrix(matrix), quantization, dimensions)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, queries: np.ndarray, k: int) -> list[list[str]]:
+        """
+        Returns the `k` chunks closest to each query row, closest first. The chunk
+        vectors have unit length, so ranking by dot product gives the same order
+        as the euclidean distance the chroma stores used.
+        """
+        top = vectors.top_k(vectors.to_matrix(queries), self.matrix, k)
+        return [[self.chunks[j] for j in row] for row in top]
+
+
+def split_manifesto(summary: str) -> list[str]:
+    return [doc.page_content for doc in get_splitter().create_documents([summary])]
+
+
+def index_version() -> str:
+    """
+    Hash of the settings every chunk of the index depends on besides its text.
+    """
+    payload = f"{EMBEDDING_MODEL}\x00{config.CHUNK_SIZE}\x00{config.CHUNK_OVERLAP}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def summary_hash(summary: str) -> str:
+    return hashlib.sha256(summary.encode("utf-8")).hexdigest()
+
+
+def _read_index(path: Path) -> pd.DataFrame:
+    if not path.exists():
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return vectors.read_parquet(str(path), embedding_columns=["embedding"])
+
+
+def build_index(force: bool = False) -> pd.DataFrame:
+    """
+    Builds `config.INDEX_PARQUET_PATH` from the manifesto summaries in
+    `config.CLEANED_PARQUET_PATH`. Manifestos whose summary and index settings are
+    unchanged keep their chunks and vectors, all others are chunked in one pass
+    and their chunks embedded together in large concurrent batches.
+
+    Args:
+        force: Rebuild every manifesto.
+
+    Returns:
+        The index with one row per chunk.
+    """
+    started = time.perf_counter()
+    path = Path(config.INDEX_PARQUET_PATH)
+    manifestos = pd.read_parquet(config.CLEANED_PARQUET_PATH)
+    manifestos["summary_hash"] = manifestos["summary"].map(summary_hash)
+    version = index_version()
+
+    existing = _read_index(path)
+    current = set(zip(manifestos["party"], manifestos["year"], manifestos["summary_hash"]))
+    keep = (existing["index_version"] == version) & pd.Series(
+        [key in current for key in zip(existing["party"], existing["year"], existing["summary_hash"])],
+        index=existing.index,
+        dtype=bool,
+    )
+    if force:
+        keep[:] = False
+    reused = existing[keep]
+    reused_keys = set(zip(reused["party"], reused["year"], reused["summary_hash"]))
+    changed = manifestos[
+        [
+            key not in reused_keys
+            for key in zip(manifestos["party"], manifestos["year"], manifestos["summary_hash"])
+        ]
+    ]
+    if changed.empty and keep.all():
+        logger.info(f"Manifesto index is up to date with {len(existing)} chunks.")
+        return existing
+
+    rows = [
+        {
+            "index_version": version,
+            "party": manifesto["party"],
+            "year": manifesto["year"],
+            "summary_hash": manifesto["summary_hash"],
+            "chunk_index": i,
+            "chunk": chunk,
+        }
+        for _, manifesto in changed.iterrows()
+        for i, chunk in enumerate(split_manifesto(manifesto["summary"]))
+    ]
+    embeddings = embed_texts([row["chunk"] for row in rows], model=EMBEDDING_MODEL)
+    new = pd.DataFrame(rows, columns=INDEX_COLUMNS[:-1])
+    new["embedding"] = embeddings
+    missing = new["embedding"].isna()
+    if missing.any():
+        logger.warning(f"Dropping {missing.sum()} manifesto chunks without embedding")
+        new = new[~missing]
+
+    index = (
+        pd.concat([reused, new], ignore_index=True)
+        .sort_values(["party", "year", "chunk_index"])
+        .reset_index(drop=True)
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    vectors.write_parquet(index, str(tmp_path), embedding_columns=["embedding"])
+    os.replace(tmp_path, path)
+
+    logger.info(
+        f"Built manifesto index in {time.perf_counter() - started:.1f}s: "
+        f"{len(changed)} manifestos rebuilt with {len(new)} chunks, "
+        f"{len(reused_keys)} reused, {len(index)} chunks in total."
+    )
+    for (party, year), count in index.groupby(["party", "year"]).size().items():
+        logger.info(f"{party} {year}: {count} chunks")
+    return index
+
+
+def load_index() -> pd.DataFrame:
+    return build_index()
+
+
+def read_index() -> pd.DataFrame:
+    """
+    Reads the manifesto index as it was last built, without updating it.
+
+    Raises:
+        FileNotFoundError: If the index has not been built yet.
+    """
+    path = Path(config.INDEX_PARQUET_PATH)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Manifesto index {path} not found, build it with src/run_build_index.py."
+        )
+    return _read_index(path)
+
+
+@cache
+def _load_manifesto_indexes() -> dict[str, dict[str, ManifestoIndex]]:
+    # search matrices are built once per process, the float32 index table is
+    # dropped afterwards
+    index = load_index()
+    indexes: dict[str, dict[str, ManifestoIndex]] = {}
+    for (party, year), chunks in index.groupby(["party", "year"]):
+        indexes.setdefault(party, {})[year] = ManifestoIndex(
+            chunks["chunk"].tolist(), vectors.to_matrix(chunks["embedding"])
+        )
+    return indexes
+
+
+def get_manifesto_indexes(party: str) -> dict[str, ManifestoIndex]:
+    """
+    Returns one `ManifestoIndex` per manifesto year of a party from the manifesto
+    index, building the index first where it is outdated.
+    """
+    if party not in PARTIES:
+        raise ValueError(f"Party {party} is not supported. Choose from {PARTIES}.")
+    return _load_manifesto_indexes().get(party, {})
@@ -1,7 +1,10 @@
-THREADS = 2
 DEEPSEEK_MODEL = "deepseek-chat"
 
 SIMILARITY_K = 5
+# retrieved manifesto chunks per (party, vote), keyed by the version of the corpus
+CONTEXTS_PARQUET_PATH = "data/prediction/contexts.parquet"
+# rough token count of the retrieved manifesto chunks in a prediction request
+CONTEXT_TOKENS = 1500
 
 PREDICTION_PROMPT = """
 Entscheide anhand der folgenden Informationen aus dem Wahlprogramm einer imaginären Partei, ob die Partei sich bei dem gegebenen Antrag enthalten hat, oder für bzw. gegen den Antrag im Bundestag gestimmt hat.
@@ -15,4 +18,40 @@ Der Output muss immer DIREKT mit entweder "enthält sich", "stimmt zu" oder "sti
 
 """
 
+# "structured" asks for a schema-constrained decision and a short reasoning,
+# "text" for a free-form answer that has to start with the decision
+DECISION_MODE = "text"
+# stream the structured answer and stop as soon as the decision is complete,
+# skipping the reasoning
+DECISION_ONLY = False
+REASONING_MAX_CHARS = 400
+
+STRUCTURED_PREDICTION_PROMPT = f"""
+Entscheide anhand der folgenden Informationen aus dem Wahlprogramm einer imaginären Partei, ob die Partei sich bei dem gegebenen Antrag enthalten hat, oder für bzw. gegen den Antrag im Bundestag gestimmt hat.
+
+Berücksichtige dabei:
+- Eine Zustimmung ("stimmt zu") erfolgt nur, wenn der Antrag klar mit den Werten oder Forderungen der Partei übereinstimmt.
+- Eine Ablehnung ("stimmt nicht zu") erfolgt nur, wenn der Antrag klar gegen die Positionen der Partei steht.
+- Wenn die Position der Partei unklar, widersprüchlich oder nicht einschätzbar ist, dann wähle "enthält sich".
+
+Gib die Entscheidung im Feld "decision" an und begründe sie im Feld "reasoning" in höchstens {REASONING_MAX_CHARS} Zeichen.
+"""
+
+# votes of a party under the same manifesto that share one structured request,
+# 1 sends every vote on its own. Packed answers are not comparable with runs that
+# predicted every vote separately
+PACK_SIZE = 1
+
+PACKED_PREDICTION_PROMPT = f"""
+Entscheide für jeden der folgenden Anträge anhand der Auszüge aus dem Wahlprogramm einer imaginären Partei, ob die Partei sich bei dem Antrag enthalten hat, oder für bzw. gegen den Antrag im Bundestag gestimmt hat.
+Bei jedem Antrag steht, welche Auszüge aus dem Wahlprogramm für ihn relevant sind. Entscheide jeden Antrag unabhängig von den anderen.
+
+Berücksichtige dabei:
+- Eine Zustimmung ("stimmt zu") erfolgt nur, wenn der Antrag klar mit den Werten oder Forderungen der Partei übereinstimmt.
+- Eine Ablehnung ("stimmt nicht zu") erfolgt nur, wenn der Antrag klar gegen die Positionen der Partei steht.
+- Wenn die Position der Partei unklar, widersprüchlich oder nicht einschätzbar ist, dann wähle "enthält sich".
+
+Gib für jeden Antrag genau einen Eintrag zurück, mit seiner Nummer im Feld "antrag", der Entscheidung im Feld "decision" und einer Begründung in höchstens {REASONING_MAX_CHARS} Zeichen im Feld "reasoning".
+"""
+
 PREDICTIONS_OUTPUT_PATH = "data/predictions.parquet"
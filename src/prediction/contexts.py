@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from loguru import logger
+
+from src.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_QUANTIZATION,
+    EMBEDDING_SEARCH_DIMENSIONS,
+    PARTIES,
+)
+from src.manifestos import config as manifestos_config
+from src.manifestos.retrieval import get_manifesto_indexes
+from src.prediction import config
+from src.utils import vectors
+from src.utils.locking import file_lock
+
+COLUMNS = ["corpus_version", "party", "vote_id", "vote_hash", "manifesto_year", "chunks"]
+
+# manifesto year and retrieved chunks of a vote
+RetrievedContext = tuple[str, list[str]]
+
+
+def get_correct_manifesto_year(
+    date: datetime, party: str, manifestos_metadata: pd.DataFrame
+) -> str | None:
+    only_party = manifestos_metadata.query("party == @party").sort_values(
+        "valid_starting", ascending=True
+    )
+    after_date = only_party.query("valid_starting < @date")
+    try:
+        correct_row = after_date.iloc[-1]
+        return correct_row["year"]
+    except IndexError:
+        logger.warning(
+            f"No manifesto found for {party} before {date.strftime('%Y-%m-%d')}"
+        )
+        return None
+
+
+def retrieve_contexts(
+    votes: list[pd.Series], party: str, manifestos: pd.DataFrame
+) -> list[RetrievedContext | None]:
+    """
+    Returns the manifesto year that applies to each vote and the manifesto chunks
+    closest to its summary, or None if the party had no manifesto at the time or
+    its manifesto has no chunks in the index. Votes under the same manifesto are
+    searched together.
+    """
+    indexes = get_manifesto_indexes(party)
+    years = [get_correct_manifesto_year(vote["date"], party, manifestos) for vote in votes]
+    contexts: list[RetrievedContext | None] = [None] * len(votes)
+    for year in {year for year in years if year is not None}:
+        positions = [i for i, y in enumerate(years) if y == year]
+        index = indexes.get(year)
+        if index is None:
+            logger.warning(
+                f"No indexed chunks for the {party} manifesto of {year}, "
+                f"skipping {len(positions)} votes."
+            )
+            continue
+        queries = vectors.to_matrix(votes[i]["summary_embedding"] for i in positions)
+        for i, chunks in zip(positions, index.search(queries, config.SIMILARITY_K)):
+            contexts[i] = (str(year), chunks)
+    return contexts
+
+
+def corpus_version(manifestos: pd.DataFrame) -> str:
+    """
+    Hash of everything the retrieved chunks of a party depend on besides the vote:
+    its manifesto summaries and validity dates, chunking, embedding model and its
+    search representation, and k.
+    """
+    corpus = manifestos.sort_values("year")[["party", "year", "valid_starting", "summary"]]
+    payload = json.dumps(
+        {
+            "corpus": corpus.astype(str).values.tolist(),
+            "embedding_model": EMBEDDING_MODEL,
+            "quantization": EMBEDDING_QUANTIZATION,
+            "dimensions": EMBEDDING_SEARCH_DIMENSIONS,
+            "chunk_size": manifestos_config.CHUNK_SIZE,
+            "chunk_overlap": manifestos_config.CHUNK_OVERLAP,
+            "k": config.SIMILARITY_K,
+        },
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def vote_hash(vote: pd.Series) -> str:
+    payload = f"{vote['date']:%Y-%m-%d}\x00{vote['summary']}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read() -> pd.DataFrame:
+    path = Path(config.CONTEXTS_PARQUET_PATH)
+    if not path.exists():
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.read_parquet(path)
+
+
+def _append(rows: list[dict]) -> None:
+    path = Path(config.CONTEXTS_PARQUET_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(f"{path}.lock"):
+        contexts = pd.concat(
+            [_read(), pd.DataFrame(rows, columns=COLUMNS)], ignore_index=True
+        ).drop_duplicates(subset=["corpus_version", "party", "vote_id"], keep="last")
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        contexts.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+def get_contexts(
+    party: str, votes: list[pd.Series], manifestos: pd.DataFrame
+) -> list[RetrievedContext | None]:
+    """
+    Returns the retrieved context of every vote for a party from
+    `config.CONTEXTS_PARQUET_PATH`. Only votes that are missing for the current
+    corpus version, or whose summary or date changed, are retrieved and added.
+    """
+    manifestos = manifestos[manifestos["party"] == party]
+    version = corpus_version(manifestos)
+    stored = _read().query("corpus_version == @version and party == @party")
+    by_vote = {row.vote_id: row for row in stored.itertuples(index=False)}
+
+    contexts: list[RetrievedContext | None] = [None] * len(votes)
+    hashes = [vote_hash(vote) for vote in votes]
+    missing = []
+    for i, vote in enumerate(votes):
+        row = by_vote.get(vote["vote_id"])
+        if row is None or row.vote_hash != hashes[i]:
+            missing.append(i)
+        elif row.manifesto_year is not None:
+            contexts[i] = (row.manifesto_year, list(row.chunks))
+    if not missing:
+        return contexts
+
+    logger.info(f"Retrieving manifesto contexts of {len(missing)} votes for {party}.")
+    retrieved = retrieve_contexts([votes[i] for i in missing], party, manifestos)
+    rows = []
+    for i, context in zip(missing, retrieved):
+        contexts[i] = context
+        rows.append(
+            {
+                "corpus_version": version,
+                "party": party,
+                "vote_id": votes[i]["vote_id"],
+                "vote_hash": hashes[i],
+                "manifesto_year": context[0] if context else None,
+                "chunks": context[1] if context else [],
+            }
+        )
+    _append(rows)
+    return contexts
+
+
+def precompute_contexts(votes: pd.DataFrame, manifestos: pd.DataFrame) -> None:
+    """
+    Materializes the retrieved contexts of every (party, vote) pair, so that
+    predictions with other models or providers skip retrieval.
+    """
+    rows = [row for _, row in votes.iterrows()]
+    for party in PARTIES:
+        contexts = get_contexts(party, rows, manifestos)
+        logger.info(
+            f"{sum(c is not None for c in contexts)} of {len(rows)} votes have a "
+            f"manifesto context for {party}."
+        )
@@ -1,36 +1,30 @@
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
-from pathlib import Path
+from functools import partial
 from typing import TypedDict
 
 import pandas as pd
-from langchain_chroma import Chroma
 from loguru import logger
-from tqdm import tqdm
+from pydantic import ValidationError
 
 from src.enums import APIProviderEnum, VoteResultEnum
-from src.manifestos.embed import get_rag_embeddings
 from src.prediction import config
-from src.utils.llm import deepseek_client, openai_client
-from src.votes.config import RESULT_CSV_FOLDER
+from src.prediction.contexts import RetrievedContext, get_contexts
+from src.utils.llm import batch, dispatcher, gateway
+from src.utils.llm.schemas import (
+    PackedDecision,
+    PackedPredictionDecisions,
+    PredictionDecision,
+    response_format,
+)
+from src.utils.llm.tokens import estimate_tokens
+from src.votes.result_store import get_result_store
 
 
-def get_correct_manifesto_year(
-    date: datetime, party: str, manifestos_metadata: pd.DataFrame
-) -> str | None:
-    only_party = manifestos_metadata.query("party == @party").sort_values(
-        "valid_starting", ascending=True
-    )
-    after_date = only_party.query("valid_starting < @date")
-    try:
-        correct_row = after_date.iloc[-1]
-        return correct_row["year"]
-    except IndexError:
-        logger.warning(
-            f"No manifesto found for {party} before {date.strftime('%Y-%m-%d')}"
-        )
-        return None
+DECISIONS = {
+    "stimmt zu": VoteResultEnum.ANNAHME.value,
+    "stimmt nicht zu": VoteResultEnum.ABLEHNUNG.value,
+    "enthält sich": VoteResultEnum.ENTHALTUNG.value,
+}
 
 
 class VotePredictionResult(TypedDict):
@@ -39,42 +33,26 @@ class VotePredictionResult(TypedDict):
     decision: str | None
 
 
-def predict_vote(
-    vote: pd.Series,
-    chroma_store: dict[str, Chroma],
-    party: str,
-    manifestos: pd.DataFrame,
-    api_provider: APIProviderEnum,
-    model: str
-) -> VotePredictionResult | None:
-    relevant_year = get_correct_manifesto_year(vote["date"], party, manifestos)
-    if relevant_year is None:
-        return None
-    vs = chroma_store[relevant_year]
-    results = vs.similarity_search_by_vector(
-        embedding=vote["summary_embedding"], k=config.SIMILARITY_K
-    )
-
-    llm_context = "\n".join([doc.page_content for doc in results])
-
-    if api_provider == APIProviderEnum.OPENAI:
-        decision_text = openai_client.prompt_openai(
-            system_prompt=config.PREDICTION_PROMPT,
-            text=f"""
+def build_prediction_request(vote: pd.Series, chunks: list[str]) -> tuple[str, str]:
+    """
+    Returns the manifesto context of a vote with the user message of its
+    prediction request.
+    """
+    llm_context = "\n".join(chunks)
+    text = f"""
                 Wahlprogramm: {llm_context} 
                 Antrag: {vote["summary"]}
-            """,
-            model=model,
-        )
-    elif api_provider == APIProviderEnum.DEEPSEEK:
-        decision_text = deepseek_client.prompt_deepseek(
-            system_prompt=config.PREDICTION_PROMPT,
-            text=f"""
-                Wahlprogramm: {llm_context} 
-                Antrag: {vote["summary"]}
-            """,
-            model=model,
-        )
+            """
+    return llm_context, text
+
+
+def prediction_prompt() -> str:
+    if config.DECISION_MODE == "structured":
+        return config.STRUCTURED_PREDICTION_PROMPT
+    return config.PREDICTION_PROMPT
+
+
+def parse_decision(llm_context: str, decision_text: str) -> VotePredictionResult:
     cleaned = re.sub(r"[^a-zA-Zä ]", "", decision_text).strip()
     if cleaned.startswith("stimmt nicht zu"):
         decision = VoteResultEnum.ABLEHNUNG.value
@@ -88,47 +66,228 @@ def predict_vote(
     return {"context": llm_context, "reasoning": decision_text, "decision": decision}
 
 
-def process(
-    idx: int,
-    row: pd.Series,
-    chroma_store: dict[str, Chroma],
-    party: str,
-    manifestos: pd.DataFrame,
+def structured_result(
+    llm_context: str, prediction: PredictionDecision | PackedDecision
+) -> VotePredictionResult:
+    return {
+        "context": llm_context,
+        "reasoning": prediction.reasoning,
+        "decision": DECISIONS[prediction.decision],
+    }
+
+
+def predict_vote(
+    vote: pd.Series,
+    context: RetrievedContext | None,
     api_provider: APIProviderEnum,
     model: str
-) -> tuple[int, VotePredictionResult | None]:
+) -> VotePredictionResult | None:
+    if context is None:
+        return None
+    llm_context, text = build_prediction_request(vote, context[1])
+
+    if config.DECISION_MODE == "structured":
+        prediction = gateway.stream_parse(
+            api_provider,
+            model,
+            system_prompt=config.STRUCTURED_PREDICTION_PROMPT,
+            text=text,
+            schema=PredictionDecision,
+            until="decision" if config.DECISION_ONLY else None,
+        )
+        return structured_result(llm_context, prediction)
+
+    decision_text = gateway.complete(
+        api_provider,
+        model,
+        system_prompt=config.PREDICTION_PROMPT,
+        text=text,
+    )
+    return parse_decision(llm_context, decision_text)
+
+
+def _parse_batch_answer(llm_context: str, answer: str) -> VotePredictionResult | None:
+    if config.DECISION_MODE != "structured":
+        return parse_decision(llm_context, answer)
     try:
-        return idx, predict_vote(row, chroma_store, party, manifestos, api_provider, model)
-    except Exception as e:
-        logger.error(f"Error processing row: {row['vote_id']}")
-        logger.exception(e)
-        return idx, None
+        return structured_result(llm_context, PredictionDecision.model_validate_json(answer))
+    except ValidationError as e:
+        logger.warning(f"Unexpected structured decision {answer}: {e}")
+        return None
+
+
+def predict_partyline_batch(
+    party: str,
+    rows: list[pd.Series],
+    contexts: list[RetrievedContext | None],
+    api_provider: APIProviderEnum,
+    model: str,
+) -> list[VotePredictionResult | None]:
+    requests = [
+        build_prediction_request(row, context[1]) if context is not None else None
+        for row, context in zip(rows, contexts)
+    ]
+    params = (
+        {"response_format": response_format(PredictionDecision)}
+        if config.DECISION_MODE == "structured"
+        else {}
+    )
+    answers = batch.run_batch(
+        f"predictions-{party}",
+        api_provider,
+        model,
+        [
+            {"custom_id": str(i), "system_prompt": prediction_prompt(), "text": request[1]}
+            for i, request in enumerate(requests)
+            if request is not None
+        ],
+        **params,
+    )
+    return [
+        _parse_batch_answer(request[0], answers[str(i)])
+        if request is not None and answers[str(i)] is not None
+        else None
+        for i, request in enumerate(requests)
+    ]
+
+
+def build_packed_request(rows: list[pd.Series], contexts: list[list[str]]) -> str:
+    """
+    User message of a packed request: every manifesto chunk is listed once and
+    each Antrag refers to the numbers of its chunks.
+    """
+    excerpts: dict[str, int] = {}
+    for chunks in contexts:
+        for chunk in chunks:
+            excerpts.setdefault(chunk, len(excerpts) + 1)
+    lines = ["Auszüge aus dem Wahlprogramm:"]
+    lines += [f"[{number}] {chunk}" for chunk, number in excerpts.items()]
+    lines.append("")
+    lines.append("Anträge:")
+    for i, (row, chunks) in enumerate(zip(rows, contexts), start=1):
+        references = ", ".join(str(excerpts[chunk]) for chunk in dict.fromkeys(chunks))
+        lines.append(f"Antrag {i} (Auszüge {references}): {row['summary']}")
+    return "\n".join(lines)
+
+
+def predict_pack(
+    rows: list[pd.Series],
+    contexts: list[list[str]],
+    api_provider: APIProviderEnum,
+    model: str,
+) -> list[VotePredictionResult | None]:
+    """
+    Predicts several votes under the same manifesto in one request. Items the
+    answer does not cover are None, so they can be retried on their own.
+    """
+    try:
+        answer = gateway.parse(
+            api_provider,
+            model,
+            system_prompt=config.PACKED_PREDICTION_PROMPT,
+            text=build_packed_request(rows, contexts),
+            schema=PackedPredictionDecisions,
+        )
+    except (ValidationError, ValueError) as e:
+        logger.warning(f"Unparsable packed prediction of {len(rows)} votes: {e}")
+        return [None] * len(rows)
+    decisions = {decision.antrag: decision for decision in answer.decisions}
+    return [
+        structured_result("\n".join(chunks), decisions[i])
+        if i in decisions
+        else None
+        for i, chunks in enumerate(contexts, start=1)
+    ]
+
+
+def predict_partyline_packed(
+    rows: list[pd.Series],
+    retrieved: list[RetrievedContext | None],
+    api_provider: APIProviderEnum,
+    model: str,
+) -> list[VotePredictionResult | None]:
+    by_year: dict[str, list[int]] = {}
+    for i, context in enumerate(retrieved):
+        if context is not None:
+            by_year.setdefault(context[0], []).append(i)
+    packs = [
+        indices[start : start + config.PACK_SIZE]
+        for indices in by_year.values()
+        for start in range(0, len(indices), config.PACK_SIZE)
+    ]
+    logger.info(f"Packing {sum(len(p) for p in packs)} votes into {len(packs)} requests.")
+
+    pack_results = dispatcher.run_calls(
+        [
+            partial(
+                predict_pack,
+                [rows[i] for i in pack],
+                [retrieved[i][1] for i in pack],
+                api_provider,
+                model,
+            )
+            for pack in packs
+        ],
+        api_provider,
+        token_counts=[
+            estimate_tokens(
+                config.PACKED_PREDICTION_PROMPT + "".join(rows[i]["summary"] for i in pack)
+            )
+            + config.CONTEXT_TOKENS * len(pack)
+            for pack in packs
+        ],
+    )
+    results: list[VotePredictionResult | None] = [None] * len(rows)
+    for pack, pack_result in zip(packs, pack_results):
+        for i, result in zip(pack, pack_result or [None] * len(pack)):
+            results[i] = result
+
+    missing = [i for i, context in enumerate(retrieved) if context is not None and results[i] is None]
+    if missing:
+        logger.info(f"Falling back to single requests for {len(missing)} votes.")
+        fallback = dispatcher.run_calls(
+            [
+                partial(predict_vote, rows[i], retrieved[i], api_provider, model)
+                for i in missing
+            ],
+            api_provider,
+            token_counts=[
+                estimate_tokens(prediction_prompt() + rows[i]["summary"]) + config.CONTEXT_TOKENS
+                for i in missing
+            ],
+        )
+        for i, result in zip(missing, fallback):
+            results[i] = result
+    return results
 
 
 def predict_partyline(
-    party: str, votes: pd.DataFrame, manifestos: pd.DataFrame, api_provider: APIProviderEnum, model: str
+    party: str,
+    votes: pd.DataFrame,
+    manifestos: pd.DataFrame,
+    api_provider: APIProviderEnum,
+    model: str,
+    use_batch: bool = False,
 ) -> list[VotePredictionResult]:
-    if not Path(f"{RESULT_CSV_FOLDER}/{party}.csv").exists():
+    if party not in get_result_store().parties():
         raise FileNotFoundError(
             f"Results file for party {party} not found. Please run the preprocessing step first."
         )
 
-    manifestos = manifestos[manifestos["party"] == party]
-    manifesto_chroma_db = get_rag_embeddings(party)
-
-    decisions = [None] * len(votes)
-    with (
-        ThreadPoolExecutor(max_workers=config.THREADS) as pool,
-        tqdm(total=len(votes)) as pbar,
-    ):
-        futures = [
-            pool.submit(process, i, row, manifesto_chroma_db, party, manifestos, api_provider, model)
-            for i, (_, row) in enumerate(votes.iterrows())
-        ]
-
-        for future in as_completed(futures):
-            i, decision = future.result()
-            decisions[i] = decision
-            pbar.update(1)
-
-    return decisions
+    rows = [row for _, row in votes.iterrows()]
+    contexts = get_contexts(party, rows, manifestos)
+    if use_batch:
+        return predict_partyline_batch(party, rows, contexts, api_provider, model)
+    if config.PACK_SIZE > 1 and config.DECISION_MODE == "structured":
+        return predict_partyline_packed(rows, contexts, api_provider, model)
+    return dispatcher.run_calls(
+        [
+            partial(predict_vote, row, context, api_provider, model)
+            for row, context in zip(rows, contexts)
+        ],
+        api_provider,
+        token_counts=[
+            estimate_tokens(prediction_prompt() + row["summary"]) + config.CONTEXT_TOKENS
+            for row in rows
+        ],
+    )
@@ -0,0 +1,20 @@
+import argparse
+
+from src.manifestos.retrieval import build_index
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Chunk and embed all manifestos into the retrieval index."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every manifesto instead of only the changed ones.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build_index(force=args.force)
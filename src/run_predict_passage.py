@@ -7,20 +7,13 @@ import joblib
 import pandas as pd
 from loguru import logger
 
-
-def load_csvs_in_dir(
-    directory: Path, pattern: str = "*.csv", **read_csv_kwargs
-) -> pd.DataFrame:
-    frames: list[pd.DataFrame] = []
-    for p in sorted(directory.glob(pattern)):
-        frames.append(pd.read_csv(p, **read_csv_kwargs))
-    if not frames:
-        raise FileNotFoundError(f"No CSVs found in {directory}")
-    return pd.concat(frames, ignore_index=True)
+from src.votes.result_store import VoteResultStore
 
 
-def load_ground_truth(results_dir: Path) -> pd.DataFrame:
-    gt = load_csvs_in_dir(results_dir)
+def load_ground_truth(results_path: Path) -> pd.DataFrame:
+    gt = VoteResultStore(str(results_path)).load()
+    if gt.empty:
+        raise FileNotFoundError(f"No vote results found in {results_path}")
     cols = ["vote_id", "Annahme", "Ablehnung", "Enthaltung"]
     missing = [c for c in cols if c not in gt.columns]
     if missing:
@@ -114,7 +107,7 @@ def main(
     encoder_path: Path = Path("output/label_encoder.pkl"),
     seats_path: Path = Path("input/seats_in_parliament.csv"),
     votes_parquet_path: Path = Path("output/votes.parquet"),
-    results_dir: Path = Path("data/votes/results"),
+    results_path: Path = Path("data/votes/results.parquet"),
 ) -> None:
     logger.info("Loading inputs") 
     test_df = pd.read_parquet(test_data_path)
@@ -122,7 +115,7 @@ def main(
     encoder = joblib.load(encoder_path)
     seats_df = pd.read_csv(seats_path, sep=";")
     votes_df = pd.read_parquet(votes_parquet_path)
-    ground_truth = load_ground_truth(results_dir)
+    ground_truth = load_ground_truth(results_path)
 
     logger.info("Filtering constitution amendments")
     excluded_ids = find_constitution_amendment_vote_ids(votes_df)
@@ -139,4 +132,5 @@ def main(
     print(cm)
 
 
-main()
+if __name__ == "__main__":
+    main()
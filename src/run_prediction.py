@@ -9,7 +9,10 @@ from src.feature_engineering.categories import get_category_column
 from src.feature_engineering.legislature_period import get_legislature_period_metadata
 from src.feature_engineering.mirror_beschlussempfehlung import prepare_final_dataset
 from src.prediction.config import PREDICTIONS_OUTPUT_PATH
+from src.prediction.contexts import precompute_contexts
 from src.prediction.predict_partyline import predict_partyline
+from src.utils import vectors
+from src.utils.llm import gateway
 from src.votes.build import is_own_proposal
 from src.votes.config import OUTPUT_PARQUET_PATH
 
@@ -31,24 +34,32 @@ def load_votes():
         raise FileNotFoundError(
             "Votes data not found. Please run the preprocessing step first."
         )
-    votes = pd.read_parquet(OUTPUT_PARQUET_PATH)
+    votes = vectors.read_parquet(
+        OUTPUT_PARQUET_PATH, embedding_columns=["summary_embedding"]
+    )
     votes["date"] = pd.to_datetime(
         votes["date"], format="%Y-%m-%d"
     )
     return votes
 
 
-def run_prediction(name: str, api_provider: APIProviderEnum, model: str = "gpt-4.1") -> None:
+def run_prediction(
+    name: str, api_provider: APIProviderEnum, model: str = "gpt-4.1", use_batch: bool = False
+) -> None:
     votes = load_votes()
     manifestos = load_manifestos()
 
+    precompute_contexts(votes, manifestos)
+
     all_predictions = None
 
     for party in config.PARTIES:
         logger.info(f"Processing party: {party}")
         party_votes = votes.copy()
         party_votes["party"] = party
-        party_votes["reasoning"] = predict_partyline(party, votes, manifestos, api_provider, model)
+        party_votes["reasoning"] = predict_partyline(
+            party, votes, manifestos, api_provider, model, use_batch
+        )
         party_votes = party_votes[party_votes["reasoning"].notna()]
         party_votes["prediction"] = party_votes["reasoning"].str["decision"]
 
@@ -91,7 +102,7 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--api-provider",
-        choices=["openai", "deepseek"],
+        choices=[provider.value for provider in APIProviderEnum],
         default="openai",
         help="API provider to use.",
     )
@@ -100,10 +111,16 @@ def parse_args() -> argparse.Namespace:
         default="gpt-4.1",
         help="Model identifier to use with the selected API provider.",
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit the requests as resumable batch jobs instead of live requests.",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    provider = APIProviderEnum[args.api_provider]
-    run_prediction(args.name, provider, args.model)
\ No newline at end of file
+    provider = APIProviderEnum(args.api_provider)
+    run_prediction(args.name, provider, args.model, args.batch)
+    gateway.log_cache_stats()
\ No newline at end of file
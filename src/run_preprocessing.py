@@ -1,6 +1,8 @@
+import argparse
 from pathlib import Path
 
 from src.manifestos.download import download_manifestos
+from src.manifestos.retrieval import build_index
 from src.votes import build as build_votes
 from src.votes.gather import scrape_urls
 
@@ -24,14 +26,27 @@ def check_required_files():
             )
 
 
-def run_preprocessing():
+def run_preprocessing(use_batch: bool = False, refresh: bool = False):
     check_required_files()
     Path("data/").mkdir(exist_ok=True)
     Path("output/").mkdir(exist_ok=True)
     scrape_urls()
     download_manifestos()
-    build_votes.build()
+    build_index()
+    build_votes.build(use_batch=use_batch, refresh=refresh)
 
 
 if __name__ == "__main__":
-    run_preprocessing()
+    parser = argparse.ArgumentParser(description="Run the preprocessing pipeline.")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Summarize the votes with a resumable batch job instead of live requests.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Revalidate downloaded drucksachen and reprocess the votes of changed ones.",
+    )
+    args = parser.parse_args()
+    run_preprocessing(args.batch, args.refresh)
@@ -1,10 +1,6 @@
 from operator import le
 import joblib
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
-from xgboost import XGBClassifier
 import pandas as pd
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 
 
 def run_data_prepreprocessing(
@@ -51,6 +47,12 @@ def run_data_prepreprocessing(
 
 
 def train_model(train: pd.DataFrame):
+    # sklearn and xgboost take seconds to import, load them only for training
+    from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from xgboost import XGBClassifier
+
     train.drop(columns=["vote_id", "voting_party"], inplace=True)
     y = train.pop("ground_truth")
     X_train, X_test, y_train, y_test = train_test_split(
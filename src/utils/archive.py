@@ -0,0 +1,136 @@
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+from tqdm import tqdm
+
+from src.utils.locking import file_lock
+
+MAGIC = b"QPCPACK1"
+# key length and data length of a record
+_HEADER = struct.Struct("<HQ")
+
+
+class PackedArchive:
+    """
+    Append-only single-file store for many small binary files, e.g. PDFs.
+
+    Every record consists of a header with the key and data length, followed by the
+    key and the data. The offset table is rebuilt from the record headers when the
+    archive is opened and kept in memory, data is read through a memory map. A later
+    record with the same key shadows the earlier one.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._indexed_bytes = 0
+        self._mmap: mmap.mmap | None = None
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(f"{self.path}.lock"):
+                if not self.path.exists():
+                    self.path.write_bytes(MAGIC)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        # indexes records appended since the last refresh, possibly by other processes
+        size = self.path.stat().st_size
+        if size == self._indexed_bytes:
+            return
+        with open(self.path, "rb") as f:
+            if self._indexed_bytes == 0:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{self.path} is not a packed archive.")
+                self._indexed_bytes = len(MAGIC)
+            pos = self._indexed_bytes
+            f.seek(pos)
+            while pos + _HEADER.size <= size:
+                key_len, data_len = _HEADER.unpack(f.read(_HEADER.size))
+                end = pos + _HEADER.size + key_len + data_len
+                if end > size:
+                    # incomplete record from an interrupted write
+                    break
+                key = f.read(key_len).decode("utf-8")
+                self._offsets[key] = (pos + _HEADER.size + key_len, data_len)
+                f.seek(end)
+                pos = end
+            self._indexed_bytes = pos
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._offsets:
+                self._refresh()
+            return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._offsets)
+
+    def get(self, key: str) -> bytes:
+        """
+        Returns the data stored under `key`.
+
+        Raises:
+            KeyError: If the archive does not contain the key.
+        """
+        with self._lock:
+            if key not in self._offsets:
+                self._refresh()
+            offset, length = self._offsets[key]
+            return self._mmap[offset : offset + length]
+
+    def add(self, key: str, data: bytes) -> None:
+        encoded_key = key.encode("utf-8")
+        with self._lock, file_lock(f"{self.path}.lock"):
+            self._refresh()
+            with open(self.path, "r+b") as f:
+                # drop the tail of an interrupted write before appending
+                f.truncate(self._indexed_bytes)
+                f.seek(self._indexed_bytes)
+                f.write(_HEADER.pack(len(encoded_key), len(data)) + encoded_key + data)
+            self._refresh()
+
+    def import_directory(
+        self,
+        directory: str,
+        pattern: str = "*.pdf",
+        key_from_path: Callable[[Path], str] = lambda p: p.stem,
+    ) -> int:
+        """
+        Adds all files below `directory` that match `pattern` and are not yet part
+        of the archive.
+
+        Args:
+            directory: Directory with the existing per-file layout.
+            pattern: Glob pattern of the files to import.
+            key_from_path: Maps a file path to its archive key.
+
+        Returns:
+            The number of imported files.
+        """
+        imported = 0
+        for file_path in tqdm(sorted(Path(directory).glob(pattern)), unit="file"):
+            key = key_from_path(file_path)
+            if key in self:
+                continue
+            self.add(key, file_path.read_bytes())
+            imported += 1
+        logger.info(f"Imported {imported} files from {directory} into {self.path}.")
+        return imported
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
@@ -1,57 +1,223 @@
-import time
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cache
 from pathlib import Path
+from typing import Iterable
 
 import pandas as pd
 import requests
 from loguru import logger
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
 
-from src.utils.pdf import extract_first_page
+from src import config
+from src.utils.manifest import DownloadManifest
+from src.utils.pdf import extract_first_page, file_hash
+from src.utils.ratelimit import get_host_bucket
 
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
 
-def download_file(fileurl: str, save_to_path: str, delay: int = 0.5) -> None:
+
+@cache
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide session whose keep-alive connections are reused by
+    all downloads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.DOWNLOAD_WORKERS,
+        pool_maxsize=config.DOWNLOAD_WORKERS,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+@cache
+def get_manifest() -> DownloadManifest:
+    return DownloadManifest(config.DOWNLOAD_MANIFEST_PATH)
+
+
+_path_locks: dict[str, threading.RLock] = {}
+_path_locks_lock = threading.Lock()
+
+
+def path_lock(path: str) -> threading.RLock:
+    """
+    Returns the lock of a local path. It is held while a file is downloaded to the
+    path, so threads that need the same file wait for one transfer instead of
+    writing the same partial file.
+    """
+    with _path_locks_lock:
+        return _path_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+def _validate(file_path: Path) -> None:
+    if file_path.suffix == ".pdf":
+        # try to open the file to ensure it was downloaded correctly
+        try:
+            extract_first_page(str(file_path))
+        except Exception as e:
+            logger.error(f"Error extracting first page from {file_path}: {e}.")
+            raise RuntimeError(f"Downloaded file {file_path} is not a valid PDF.")
+    elif file_path.suffix in {".xls", ".xlsx"}:
+        try:
+            pd.read_excel(file_path)
+        except Exception as e:
+            logger.error(f"Error reading Excel file {file_path}: {e}.")
+            raise RuntimeError(
+                f"Downloaded file {file_path} is not a valid Excel file."
+            )
+
+
+def ensure_validated(file_path: str) -> None:
+    """
+    Validates a downloaded file unless the manifest already records it as valid,
+    and records the outcome.
+
+    Raises:
+        RuntimeError: If the file is not a valid PDF or Excel file.
+    """
+    manifest = get_manifest()
+    if manifest.is_valid(file_path):
+        return
+    try:
+        _validate(Path(file_path))
+    except RuntimeError:
+        manifest.update(file_path, valid=False)
+        raise
+    manifest.update(
+        file_path,
+        size=os.stat(file_path).st_size,
+        sha256=file_hash(file_path),
+        valid=True,
+    )
+
+
+def _request(fileurl: str, headers: dict) -> requests.Response:
+    get_host_bucket(fileurl, config.DOWNLOAD_REQUESTS_PER_SECOND).acquire()
+    return get_session().get(
+        fileurl, stream=True, timeout=config.DOWNLOAD_TIMEOUT, headers=headers
+    )
+
+
+def download_file(fileurl: str, save_to_path: str, refresh: bool = False) -> None:
     """
-    Downloads a file from a given URL and saves it to disk.
+    Downloads a file from a given URL and saves it to disk. The file is written to a
+    partial file, validated and then renamed, so `save_to_path` only ever contains
+    complete files. Interrupted transfers are resumed with a Range request, and every
+    download is recorded in the download manifest. Requests are rate limited per host.
 
     Args:
         fileurl (str): The URL to download the file from.
         save_to_path (str): The file path to save the downloaded file to.
+        refresh (bool): Re-fetch existing files with a conditional GET.
     """
-    if Path(save_to_path).exists():
+    target = Path(save_to_path)
+    if target.exists() and not refresh:
         return
+    with path_lock(save_to_path):
+        # another thread may have downloaded the file while this one waited
+        if target.exists() and not refresh:
+            return
+        _download_file(fileurl, save_to_path)
 
-    r = requests.get(
-        fileurl,
-        stream=True,
-        headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        },
-    )
+
+def _download_file(fileurl: str, save_to_path: str) -> None:
+    target = Path(save_to_path)
+    manifest = get_manifest()
+    entry = manifest.get(save_to_path) or {}
+    # keep the suffix so validation can tell the file type
+    part_path = target.with_name(f"{target.stem}.part{target.suffix}")
+
+    headers = {}
+    if target.exists():
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    elif part_path.exists() and entry.get("url") == fileurl:
+        headers["Range"] = f"bytes={part_path.stat().st_size}-"
+        if entry.get("etag"):
+            headers["If-Range"] = entry["etag"]
+    else:
+        part_path.unlink(missing_ok=True)
+
+    r = _request(fileurl, headers)
+    if r.status_code == 304:
+        manifest.update(save_to_path, url=fileurl)
+        return
+    if r.status_code == 416:
+        # the partial file is unusable, start over
+        part_path.unlink(missing_ok=True)
+        headers.pop("Range", None)
+        headers.pop("If-Range", None)
+        r = _request(fileurl, headers)
     r.raise_for_status()
-    with open(save_to_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=1024):
+
+    manifest.update(
+        save_to_path,
+        url=fileurl,
+        etag=r.headers.get("ETag"),
+        last_modified=r.headers.get("Last-Modified"),
+        valid=False,
+    )
+    with open(part_path, "ab" if r.status_code == 206 else "wb") as f:
+        for chunk in r.iter_content(chunk_size=config.DOWNLOAD_CHUNK_SIZE):
             if chunk:
                 f.write(chunk)
 
-    time.sleep(delay)  # Delay to avoid overwhelming the server
+    try:
+        _validate(part_path)
+    except RuntimeError:
+        part_path.unlink(missing_ok=True)
+        raise
+    size = part_path.stat().st_size
+    digest = file_hash(str(part_path))
+    os.replace(part_path, target)
+    manifest.update(save_to_path, size=size, sha256=digest, valid=True)
 
-    if save_to_path.endswith(".pdf"):
-        # try to open the file to ensure it was downloaded correctly
-        try:
-            extract_first_page(save_to_path)
-        except Exception as e:
-            logger.error(
-                f"Error extracting first page from {save_to_path}: {e}. Deleting file."
-            )
-            Path(save_to_path).unlink(missing_ok=True)
-            raise RuntimeError(f"Downloaded file {save_to_path} is not a valid PDF.")
-    elif save_to_path.endswith(".xls") or save_to_path.endswith(".xlsx"):
-        try:
-            pd.read_excel(save_to_path)
-        except Exception as e:
-            logger.error(
-                f"Error reading Excel file {save_to_path}: {e}. Deleting file."
-            )
-            Path(save_to_path).unlink(missing_ok=True)
-            raise RuntimeError(
-                f"Downloaded file {save_to_path} is not a valid Excel file."
-            )
+
+def download_files(
+    downloads: Iterable[tuple[str, str]],
+    workers: int = config.DOWNLOAD_WORKERS,
+    refresh: bool = False,
+) -> dict[str, Exception]:
+    """
+    Downloads many files concurrently over pooled connections.
+
+    Args:
+        downloads: (url, save_to_path) pairs. Files that already exist are skipped
+            unless `refresh` is set.
+        workers: Maximum number of concurrent transfers.
+        refresh: Revalidate existing files with a conditional GET, see `download_file`.
+
+    Returns:
+        The exceptions of failed downloads, keyed by their save path.
+    """
+    pending = [
+        (url, path) for url, path in downloads if refresh or not Path(path).exists()
+    ]
+    failures = {}
+    if not pending:
+        return failures
+
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        tqdm(total=len(pending), desc="Downloading", unit="file") as pbar,
+    ):
+        futures = {
+            pool.submit(download_file, url, path, refresh): path for url, path in pending
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to download {path}: {e}")
+                failures[path] = e
+            pbar.update(1)
+    return failures
@@ -1,15 +1,34 @@
-import os
+import json
+import threading
+from functools import cache
+from typing import Iterator
 
 from dotenv import load_dotenv
 import anthropic
+from pydantic import BaseModel
 
-load_dotenv()
+from src.utils.llm import dispatcher, offline
 
-client = anthropic.Anthropic()
+_client_lock = threading.Lock()
 
 
-def prompt_claude(system_prompt: str, text: str, model: str = "claude-opus-4-1") -> str:
-    response = client.messages.create(
+@cache
+def _create_client(max_retries: int) -> anthropic.Anthropic:
+    load_dotenv()
+    return anthropic.Anthropic(max_retries=max_retries, **offline.client_options())
+
+
+def get_client() -> anthropic.Anthropic:
+    # the lock keeps concurrent first calls from constructing several clients
+    with _client_lock:
+        return _create_client(dispatcher.client_max_retries())
+
+
+def prompt_claude(
+    system_prompt: str, text: str, model: str = "claude-opus-4-1", **params
+) -> str:
+    params.setdefault("max_tokens", 1000)
+    response = get_client().messages.create(
         model=model,
         system=system_prompt,
         messages=[
@@ -23,6 +42,43 @@ def prompt_claude(system_prompt: str, text: str, model: str = "claude-opus-4-1")
             ]
         }
             ],
-        max_tokens=1000
+        **params,
     )
     return response.content[0].text
+
+
+def _schema_prompt(system_prompt: str, schema: type[BaseModel]) -> str:
+    return (
+        f"{system_prompt}\n\nAntworte ausschließlich mit JSON nach diesem Schema:\n"
+        f"{json.dumps(schema.model_json_schema(), ensure_ascii=False)}"
+    )
+
+
+def parse_claude(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "claude-opus-4-1",
+    **params,
+) -> BaseModel:
+    answer = prompt_claude(_schema_prompt(system_prompt, schema), text, model=model, **params)
+    # tolerate a fenced code block around the json
+    start, end = answer.find("{"), answer.rfind("}")
+    return schema.model_validate_json(answer[start : end + 1])
+
+
+def stream_claude(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "claude-opus-4-1",
+    **params,
+) -> Iterator[str]:
+    params.setdefault("max_tokens", 1000)
+    with get_client().messages.stream(
+        model=model,
+        system=_schema_prompt(system_prompt, schema),
+        messages=[{"role": "user", "content": [{"type": "text", "text": text}]}],
+        **params,
+    ) as stream:
+        yield from stream.text_stream
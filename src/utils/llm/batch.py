@@ -0,0 +1,285 @@
+import hashlib
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Protocol, TypedDict
+
+from loguru import logger
+
+from src import config
+from src.enums import APIProviderEnum
+from src.utils.llm import gateway
+
+COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+
+
+class BatchRequest(TypedDict):
+    custom_id: str
+    system_prompt: str
+    text: str
+
+
+class BatchBackend(Protocol):
+    def submit(self, job_path: Path) -> str: ...
+
+    def status(self, batch_id: str) -> str: ...
+
+    def results(self, batch_id: str) -> list[dict]: ...
+
+
+def _answer_line(custom_id: str, content: str | None, error: str | None = None) -> dict:
+    # one line of an openai batch output file
+    if content is None:
+        return {"custom_id": custom_id, "response": None, "error": {"message": error}}
+    return {
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "body": {"choices": [{"message": {"role": "assistant", "content": content}}]},
+        },
+        "error": None,
+    }
+
+
+class OpenAIBatchBackend:
+    """
+    Runs jobs through the OpenAI batch API.
+    """
+
+    def __init__(self):
+        from src.utils.llm import openai_client
+
+        self.client = openai_client.get_client()
+
+    def submit(self, job_path: Path) -> str:
+        with open(job_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=COMPLETIONS_ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        if status in {"failed", "expired", "cancelled"}:
+            return "failed"
+        return "completed" if status == "completed" else "pending"
+
+    def results(self, batch_id: str) -> list[dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in [batch.output_file_id, batch.error_file_id]:
+            if file_id:
+                lines += self.client.files.content(file_id).text.splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for a batch API. A submitted job is copied into its own
+    folder and stays pending until `complete` answers it. If a responder is given,
+    jobs are answered on the first status check, otherwise another process has to
+    call `complete`.
+    """
+
+    def __init__(
+        self,
+        folder: str = config.LOCAL_BATCH_DIR,
+        responder: Callable[[dict], str] | None = None,
+    ):
+        self.folder = Path(folder)
+        self.responder = responder
+
+    def submit(self, job_path: Path) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch_folder = self.folder / batch_id
+        batch_folder.mkdir(parents=True)
+        (batch_folder / "input.jsonl").write_bytes(job_path.read_bytes())
+        return batch_id
+
+    def pending(self) -> list[str]:
+        return [
+            p.name
+            for p in sorted(self.folder.glob("batch_*"))
+            if not (p / "output.jsonl").exists()
+        ]
+
+    def complete(self, batch_id: str, responder: Callable[[dict], str]) -> None:
+        """
+        Answers every request of a batch with `responder`, which receives the
+        request body and returns the message content.
+        """
+        batch_folder = self.folder / batch_id
+        with open(batch_folder / "input.jsonl", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        answers = []
+        for request in requests:
+            try:
+                answers.append(_answer_line(request["custom_id"], responder(request["body"])))
+            except Exception as e:
+                answers.append(_answer_line(request["custom_id"], None, str(e)))
+        tmp_path = batch_folder / "output.jsonl.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for answer in answers:
+                f.write(json.dumps(answer, ensure_ascii=False) + "\n")
+        tmp_path.replace(batch_folder / "output.jsonl")
+
+    def status(self, batch_id: str) -> str:
+        if self.responder and batch_id in self.pending():
+            self.complete(batch_id, self.responder)
+        return "pending" if batch_id in self.pending() else "completed"
+
+    def results(self, batch_id: str) -> list[dict]:
+        with open(self.folder / batch_id / "output.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def provider_responder(provider: APIProviderEnum) -> Callable[[dict], str]:
+    """
+    Answers a batch request body with a regular request to the provider, which
+    goes to the offline stand-in when LLM_OFFLINE is set.
+    """
+
+    def respond(body: dict) -> str:
+        messages = {m["role"]: m["content"] for m in body["messages"]}
+        params = {k: v for k, v in body.items() if k not in {"model", "messages"}}
+        return gateway.complete(
+            provider,
+            body["model"],
+            messages["system"],
+            messages["user"],
+            use_cache=False,
+            **params,
+        )
+
+    return respond
+
+
+def get_backend(provider: APIProviderEnum) -> BatchBackend:
+    if config.BATCH_BACKEND == "local":
+        return LocalBatchBackend(responder=provider_responder(provider))
+    if provider != APIProviderEnum.OPENAI:
+        raise ValueError(f"Batch mode is not available for {provider.value}.")
+    return OpenAIBatchBackend()
+
+
+def _job_name(prefix: str, model: str, requests: list[BatchRequest], params: dict) -> str:
+    # identical requests map to the same job folder, which makes restarts resume it
+    digest = hashlib.sha256(
+        json.dumps([model, params, requests], sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f"{prefix}-{digest[:16]}"
+
+
+def _write_job(job_path: Path, model: str, requests: list[BatchRequest], params: dict) -> None:
+    with open(job_path, "w", encoding="utf-8") as f:
+        for request in requests:
+            body = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": request["system_prompt"]},
+                    {"role": "user", "content": request["text"]},
+                ],
+                **params,
+            }
+            line = {
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": COMPLETIONS_ENDPOINT,
+                "body": body,
+            }
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _parse_results(lines: list[dict]) -> dict[str, str | None]:
+    results = {}
+    for line in lines:
+        response = line.get("response") or {}
+        if response.get("status_code") != 200:
+            logger.error(f"Batch request {line['custom_id']} failed: {line.get('error')}")
+            results[line["custom_id"]] = None
+            continue
+        results[line["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+def run_batch(
+    prefix: str,
+    provider: APIProviderEnum,
+    model: str,
+    requests: list[BatchRequest],
+    backend: BatchBackend | None = None,
+    poll_interval: float = config.BATCH_POLL_INTERVAL,
+    timeout: float = config.BATCH_TIMEOUT,
+    **params,
+) -> dict[str, str | None]:
+    """
+    Runs completions as an offline batch job: requests are written to a JSONL job
+    file, submitted, polled until the job finishes and mapped back by custom_id.
+    The job state is kept in `config.BATCH_DIR`, so a restarted process picks up a
+    submitted job instead of submitting it again. Answers already in the gateway
+    cache are not submitted, new answers are added to it.
+
+    Args:
+        prefix: Name prefix of the job folder.
+        provider: The API provider of the batch endpoint.
+        model: The model to use.
+        requests: The requests, each with a unique custom_id.
+        backend: Batch backend, by default chosen by `get_backend`.
+        poll_interval: Seconds between status checks.
+        timeout: Seconds to wait for the job before giving up. The job state is
+            kept, so a later run resumes waiting for the same job.
+        **params: Further request parameters.
+
+    Returns:
+        The answers keyed by custom_id, None for failed requests.
+    """
+    results = {
+        r["custom_id"]: gateway.lookup(provider, model, r["system_prompt"], r["text"], **params)
+        for r in requests
+    }
+    open_requests = [r for r in requests if results[r["custom_id"]] is None]
+    logger.info(
+        f"{len(requests) - len(open_requests)} of {len(requests)} batch requests served from cache."
+    )
+    if not open_requests:
+        return results
+
+    backend = backend or get_backend(provider)
+    job_folder = Path(config.BATCH_DIR) / _job_name(prefix, model, open_requests, params)
+    job_folder.mkdir(parents=True, exist_ok=True)
+    state_path = job_folder / "state.json"
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        logger.info(f"Resuming batch {state['batch_id']} from {job_folder}.")
+    else:
+        job_path = job_folder / "job.jsonl"
+        _write_job(job_path, model, open_requests, params)
+        state = {"batch_id": backend.submit(job_path)}
+        state_path.write_text(json.dumps(state), encoding="utf-8")
+        logger.info(f"Submitted batch {state['batch_id']} with {len(open_requests)} requests.")
+
+    deadline = time.monotonic() + timeout
+    while (status := backend.status(state["batch_id"])) == "pending":
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Batch {state['batch_id']} did not finish within {timeout:.0f}s, "
+                f"run again to resume it."
+            )
+        time.sleep(poll_interval)
+    if status == "failed":
+        state_path.unlink()
+        raise RuntimeError(f"Batch {state['batch_id']} failed.")
+
+    answers = _parse_results(backend.results(state["batch_id"]))
+    for request in open_requests:
+        answer = answers.get(request["custom_id"])
+        results[request["custom_id"]] = answer
+        if answer is not None:
+            gateway.store(
+                provider, model, request["system_prompt"], request["text"], answer, **params
+            )
+    return results
@@ -1,22 +1,100 @@
+import json
 import os
+import threading
+from functools import cache
+from typing import Iterator
 
 from dotenv import load_dotenv
 from openai import OpenAI
+from pydantic import BaseModel
 
-load_dotenv()
+from src.utils.llm import dispatcher, offline
 
-client = OpenAI(
-    api_key=os.environ["DEEPSEEK_API_KEY"],
-    base_url=os.environ["DEEPSEEK_BASE_URL"],
-)
+_client_lock = threading.Lock()
 
 
-def prompt_deepseek(system_prompt: str, text: str, model: str = "deepseek-chat") -> str:
-    response = client.chat.completions.create(
+@cache
+def _create_client(max_retries: int) -> OpenAI:
+    load_dotenv()
+    if offline.get_mode() in {"synthetic", "replay"}:
+        return OpenAI(
+            base_url="https://deepseek.offline/v1",
+            max_retries=max_retries,
+            **offline.client_options(),
+        )
+    return OpenAI(
+        api_key=os.environ["DEEPSEEK_API_KEY"],
+        base_url=os.environ["DEEPSEEK_BASE_URL"],
+        max_retries=max_retries,
+        **offline.client_options(),
+    )
+
+
+def get_client() -> OpenAI:
+    # the lock keeps concurrent first calls from constructing several clients
+    with _client_lock:
+        return _create_client(dispatcher.client_max_retries())
+
+
+def prompt_deepseek(
+    system_prompt: str, text: str, model: str = "deepseek-chat", **params
+) -> str:
+    response = get_client().chat.completions.create(
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": text},
         ],
         model=model,
+        **params,
     )
     return response.choices[0].message.content
+
+
+def _schema_prompt(system_prompt: str, schema: type[BaseModel]) -> str:
+    # deepseek only offers json mode, so the schema is passed in the prompt
+    return (
+        f"{system_prompt}\n\nAntworte ausschließlich mit JSON nach diesem Schema:\n"
+        f"{json.dumps(schema.model_json_schema(), ensure_ascii=False)}"
+    )
+
+
+def parse_deepseek(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "deepseek-chat",
+    **params,
+) -> BaseModel:
+    response = get_client().chat.completions.create(
+        messages=[
+            {"role": "system", "content": _schema_prompt(system_prompt, schema)},
+            {"role": "user", "content": text},
+        ],
+        model=model,
+        response_format={"type": "json_object"},
+        **params,
+    )
+    return schema.model_validate_json(response.choices[0].message.content)
+
+
+def stream_deepseek(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "deepseek-chat",
+    **params,
+) -> Iterator[str]:
+    stream = get_client().chat.completions.create(
+        messages=[
+            {"role": "system", "content": _schema_prompt(system_prompt, schema)},
+            {"role": "user", "content": text},
+        ],
+        model=model,
+        response_format={"type": "json_object"},
+        stream=True,
+        **params,
+    )
+    with stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
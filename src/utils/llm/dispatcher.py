@@ -0,0 +1,207 @@
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, TypeVar
+
+from loguru import logger
+from tqdm import tqdm
+
+from src import config
+from src.enums import APIProviderEnum
+from src.utils.ratelimit import TokenBucket
+
+T = TypeVar("T")
+
+# status codes after which the concurrency is reduced and the call retried
+_RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# last concurrency limit per provider, so later runs start where earlier ones ended
+_limits: dict[APIProviderEnum, float] = {}
+_token_budgets: dict[APIProviderEnum, TokenBucket] = {}
+# marks the dispatcher's worker threads
+_worker = threading.local()
+
+
+def _mark_worker() -> None:
+    _worker.dispatched = True
+
+
+def client_max_retries() -> int:
+    """
+    Retries the provider sdks may make on their own. None inside the dispatcher,
+    which has to see throttled calls to retry them and adapt its concurrency.
+    """
+    return 0 if getattr(_worker, "dispatched", False) else config.LLM_CLIENT_MAX_RETRIES
+
+
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # the sdks raise their own connection and timeout errors, which carry no status
+    # code. A sdk that is not imported cannot have raised one
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    for module_name, error_name in [
+        ("openai", "APIConnectionError"),
+        ("anthropic", "APIConnectionError"),
+        ("httpx", "TransportError"),
+    ]:
+        module = sys.modules.get(module_name)
+        if module is not None and isinstance(error, getattr(module, error_name)):
+            return True
+    return False
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if "retry-after-ms" in headers:
+        return float(headers["retry-after-ms"]) / 1000
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+
+
+def _token_budget(provider: APIProviderEnum) -> TokenBucket:
+    if provider not in _token_budgets:
+        per_minute = config.LLM_TOKENS_PER_MINUTE[provider.value]
+        _token_budgets[provider] = TokenBucket(per_minute / 60, per_minute)
+    return _token_budgets[provider]
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of in-flight requests with additive increase, multiplicative
+    decrease: every `limit` successful calls raise the limit by one, a throttled,
+    overloaded or timed out call halves it. Calls rejected for other reasons, e.g.
+    an invalid request, leave it unchanged. A Retry-After answer pauses all new calls.
+    """
+
+    def __init__(self, provider: APIProviderEnum):
+        self.provider = provider
+        self.maximum = config.LLM_MAX_CONCURRENCY[provider.value]
+        self.limit = _limits.get(provider, float(config.LLM_INITIAL_CONCURRENCY))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait(), timeout=pause if pause > 0 else None
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, success: bool | None, retry_after: float | None = None) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif success is False:
+                self.limit = max(1.0, self.limit / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            _limits[self.provider] = self.limit
+            self._condition.notify_all()
+
+
+async def _run_call(
+    call: Callable[[], T],
+    tokens: int,
+    limiter: AdaptiveLimiter,
+    executor: ThreadPoolExecutor,
+) -> T | None:
+    loop = asyncio.get_running_loop()
+    budget = _token_budget(limiter.provider)
+    for attempt in range(config.LLM_MAX_RETRIES + 1):
+        while wait := budget.reserve(tokens):
+            await asyncio.sleep(wait)
+        await limiter.acquire()
+        try:
+            result = await loop.run_in_executor(executor, call)
+        except Exception as e:
+            status = _status_code(e)
+            retryable = status in _RETRY_STATUS_CODES or (
+                status is None and _is_connection_error(e)
+            )
+            if not retryable:
+                await limiter.release(success=None)
+                logger.error(f"LLM call failed: {e}")
+                return None
+            if attempt == config.LLM_MAX_RETRIES:
+                await limiter.release(success=False)
+                logger.error(f"LLM call failed after {attempt + 1} attempts: {e}")
+                return None
+            retry_after = _retry_after(e) or min(60.0, 2.0**attempt)
+            reason = f"returned {status}" if status else f"failed with {type(e).__name__}"
+            logger.warning(
+                f"{limiter.provider.value} {reason}, retrying in {retry_after:.1f}s "
+                f"with concurrency {max(1, int(limiter.limit / 2))}."
+            )
+            await limiter.release(success=False, retry_after=retry_after)
+            continue
+        await limiter.release(success=True)
+        return result
+
+
+async def dispatch(
+    calls: list[Callable[[], T]],
+    provider: APIProviderEnum,
+    token_counts: list[int] | None = None,
+) -> list[T | None]:
+    limiter = AdaptiveLimiter(provider)
+    token_counts = token_counts or [1] * len(calls)
+    with (
+        ThreadPoolExecutor(
+            max_workers=limiter.maximum, initializer=_mark_worker
+        ) as executor,
+        tqdm(total=len(calls)) as pbar,
+    ):
+
+        async def run(call: Callable[[], T], tokens: int) -> T | None:
+            result = await _run_call(call, tokens, limiter, executor)
+            pbar.update(1)
+            return result
+
+        return await asyncio.gather(
+            *(run(call, tokens) for call, tokens in zip(calls, token_counts))
+        )
+
+
+def run_calls(
+    calls: list[Callable[[], T]],
+    provider: APIProviderEnum,
+    token_counts: list[int] | None = None,
+) -> list[T | None]:
+    """
+    Runs blocking LLM calls concurrently. The number of calls in flight adapts to
+    the provider (AIMD), Retry-After headers are honoured and the provider's
+    tokens-per-minute budget is respected.
+
+    Args:
+        calls: Functions without arguments that each perform one LLM request.
+        provider: The provider the calls go to.
+        token_counts: Estimated tokens per call, charged against the budget.
+
+    Returns:
+        The results in the order of `calls`, None for calls that failed.
+    """
+    return asyncio.run(dispatch(calls, provider, token_counts))
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from tqdm import tqdm
+
+from src import config
+from src.utils import vectors
+from src.utils.llm import openai_client
+from src.utils.llm.tokens import estimate_tokens
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embeddings of one model, keyed by the sha256 of the embedded text.
+
+    Every write goes to a new parquet shard in the model's cache folder, so several
+    processes can add embeddings without coordination. All shards are loaded into
+    memory when the cache is created, embeddings are kept as float32 vectors.
+    """
+
+    def __init__(self, model: str):
+        self.folder = Path(config.EMBEDDING_CACHE_DIR) / model
+        self._lock = threading.Lock()
+        self._embeddings: dict[str, np.ndarray] = {}
+        for shard in sorted(self.folder.glob("*.parquet")):
+            digests = pd.read_parquet(shard, columns=["text_hash"])["text_hash"]
+            matrix = vectors.read_embedding_matrix(str(shard), "embedding")
+            self._embeddings.update(zip(digests, matrix))
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._embeddings
+
+    def __getitem__(self, digest: str) -> np.ndarray:
+        return self._embeddings[digest]
+
+    def add(self, embeddings: dict[str, list[float]]) -> None:
+        if not embeddings:
+            return
+        matrix = vectors.to_matrix(embeddings.values())
+        self.folder.mkdir(parents=True, exist_ok=True)
+        shard = self.folder / f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.parquet"
+        tmp_path = shard.with_suffix(".tmp")
+        vectors.write_parquet(
+            pd.DataFrame({"text_hash": list(embeddings), "embedding": list(matrix)}),
+            str(tmp_path),
+            embedding_columns=["embedding"],
+        )
+        os.replace(tmp_path, shard)
+        with self._lock:
+            self._embeddings.update(zip(embeddings, matrix))
+
+
+_caches: dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model: str) -> EmbeddingCache:
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(model)
+        return _caches[model]
+
+
+def _make_batches(texts: dict[str, str]) -> list[dict[str, str]]:
+    batches, batch, batch_tokens = [], {}, 0
+    for digest, text in texts.items():
+        tokens = estimate_tokens(text)
+        if batch and (
+            len(batch) >= config.EMBEDDING_BATCH_SIZE
+            or batch_tokens + tokens > config.EMBEDDING_BATCH_TOKENS
+        ):
+            batches.append(batch)
+            batch, batch_tokens = {}, 0
+        batch[digest] = text
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_batch(batch: dict[str, str], model: str) -> dict[str, list[float]]:
+    response = openai_client.get_client().embeddings.create(
+        input=list(batch.values()), model=model
+    )
+    data = sorted(response.data, key=lambda d: d.index)
+    embeddings = {digest: d.embedding for digest, d in zip(batch, data)}
+    get_cache(model).add(embeddings)
+    return embeddings
+
+
+def embed_texts(
+    texts: list[str | None],
+    model: str = config.EMBEDDING_MODEL,
+    workers: int = config.EMBEDDING_WORKERS,
+) -> list[np.ndarray | None]:
+    """
+    Embeds many texts. Texts that were embedded before with the same model are
+    served from the persistent cache, the rest is sent in batches of up to
+    `config.EMBEDDING_BATCH_SIZE` inputs, several batches at a time.
+
+    Args:
+        texts: The texts to embed. Missing texts yield None.
+        model: The embedding model.
+        workers: Number of concurrent embedding requests.
+
+    Returns:
+        The float32 embeddings in the order of `texts`.
+    """
+    cache = get_cache(model)
+    digests = [text_hash(t) if isinstance(t, str) and t else None for t in texts]
+    missing = {
+        digest: text
+        for digest, text in zip(digests, texts)
+        if digest is not None and digest not in cache
+    }
+    if missing:
+        batches = _make_batches(missing)
+        logger.info(
+            f"Embedding {len(missing)} texts in {len(batches)} batches, "
+            f"{len(texts) - len(missing)} served from cache."
+        )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(
+                tqdm(
+                    pool.map(lambda b: _embed_batch(b, model), batches),
+                    total=len(batches),
+                    unit="batch",
+                )
+            )
+    return [cache[d] if d is not None else None for d in digests]
+
+
+def embed_text(text: str, model: str = config.EMBEDDING_MODEL) -> np.ndarray:
+    return embed_texts([text], model=model)[0]
@@ -0,0 +1,257 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator, TypeVar
+
+from loguru import logger
+from pydantic import BaseModel
+
+from src import config
+from src.enums import APIProviderEnum
+
+T = TypeVar("T", bound=BaseModel)
+
+# provider module and its completion, structured output and structured streaming functions
+_PROVIDERS = {
+    APIProviderEnum.OPENAI: (
+        "src.utils.llm.openai_client",
+        {"prompt": "prompt_openai", "parse": "parse_openai", "stream": "stream_openai"},
+    ),
+    APIProviderEnum.DEEPSEEK: (
+        "src.utils.llm.deepseek_client",
+        {"prompt": "prompt_deepseek", "parse": "parse_deepseek", "stream": "stream_deepseek"},
+    ),
+    APIProviderEnum.ANTHROPIC: (
+        "src.utils.llm.anthropic_client",
+        {"prompt": "prompt_claude", "parse": "parse_claude", "stream": "stream_claude"},
+    ),
+}
+
+_stats: dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+
+
+def _provider_function(provider: APIProviderEnum, kind: str):
+    # provider clients are imported on first use, so missing keys of unused
+    # providers do not matter
+    module_name, functions = _PROVIDERS[provider]
+    module = importlib.import_module(module_name)
+    return getattr(module, functions[kind])
+
+
+def _cache_key(
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    text: str,
+    params: dict[str, Any],
+    schema: type[BaseModel] | None,
+) -> str:
+    payload = json.dumps(
+        {
+            "provider": provider.value,
+            "model": model,
+            "system_prompt": system_prompt,
+            "text": text,
+            "params": params,
+            "schema": schema.model_json_schema() if schema else None,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> Path:
+    return Path(config.LLM_CACHE_DIR) / key[:2] / f"{key}.json"
+
+
+def _read_cache(key: str) -> str | None:
+    path = _cache_path(key)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))["response"]
+    except Exception as e:
+        logger.warning(f"Discarding unreadable llm cache entry {path}: {e}")
+        return None
+
+
+def _write_cache(key: str, provider: APIProviderEnum, model: str, response: str) -> None:
+    path = _cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(
+        json.dumps(
+            {"provider": provider.value, "model": model, "response": response},
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, path)
+
+
+def _count(provider: APIProviderEnum, outcome: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(provider.value, Counter())[outcome] += 1
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """
+    Returns the number of cache hits and misses per provider in this process.
+    """
+    with _stats_lock:
+        return {
+            provider: {"hits": counts["hits"], "misses": counts["misses"]}
+            for provider, counts in _stats.items()
+        }
+
+
+def log_cache_stats() -> None:
+    for provider, counts in cache_stats().items():
+        total = counts["hits"] + counts["misses"]
+        logger.info(
+            f"LLM cache for {provider}: {counts['hits']} of {total} requests served from cache."
+        )
+
+
+def lookup(
+    provider: APIProviderEnum, model: str, system_prompt: str, text: str, **params
+) -> str | None:
+    """
+    Returns the cached answer of a completion request, or None.
+    """
+    return _read_cache(_cache_key(provider, model, system_prompt, text, params, None))
+
+
+def store(
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    text: str,
+    response: str,
+    **params,
+) -> None:
+    """
+    Adds an answer obtained outside of `complete`, e.g. from a batch job, to the cache.
+    """
+    key = _cache_key(provider, model, system_prompt, text, params, None)
+    _write_cache(key, provider, model, response)
+
+
+def complete(
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    text: str,
+    use_cache: bool = True,
+    **params,
+) -> str:
+    """
+    Sends a system prompt and user text to the given provider and returns the
+    answer. Answers are cached on disk by provider, model, prompts and parameters.
+
+    Args:
+        provider: The API provider to use.
+        model: The model identifier of the provider.
+        system_prompt: The system prompt.
+        text: The user message.
+        use_cache: Read from the cache. Fresh answers are always written to it.
+        **params: Further request parameters, e.g. temperature.
+    """
+    key = _cache_key(provider, model, system_prompt, text, params, None)
+    if use_cache and (cached := _read_cache(key)) is not None:
+        _count(provider, "hits")
+        return cached
+    _count(provider, "misses")
+    response = _provider_function(provider, "prompt")(
+        system_prompt, text, model=model, **params
+    )
+    if response is not None:
+        _write_cache(key, provider, model, response)
+    return response
+
+
+def parse(
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    text: str,
+    schema: type[T],
+    use_cache: bool = True,
+    **params,
+) -> T:
+    """
+    Like `complete`, but returns the answer parsed into `schema`.
+    """
+    key = _cache_key(provider, model, system_prompt, text, params, schema)
+    if use_cache and (cached := _read_cache(key)) is not None:
+        _count(provider, "hits")
+        return schema.model_validate_json(cached)
+    _count(provider, "misses")
+    parsed = _provider_function(provider, "parse")(
+        system_prompt, text, schema, model=model, **params
+    )
+    _write_cache(key, provider, model, parsed.model_dump_json())
+    return parsed
+
+
+def _complete_fields(partial_json: str) -> dict[str, str]:
+    # string fields of a streamed json object whose value has been closed already
+    return {
+        name: json.loads(f'"{value}"')
+        for name, value in re.findall(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)"', partial_json)
+    }
+
+
+def stream_parse(
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    text: str,
+    schema: type[T],
+    until: str | None = None,
+    use_cache: bool = True,
+    **params,
+) -> T:
+    """
+    Like `parse`, but streams the answer. With `until` set to a string field of
+    the schema, the stream is closed as soon as that field is complete, so the
+    string fields after it are not generated and are left empty.
+    """
+    key = _cache_key(provider, model, system_prompt, text, {**params, "until": until}, schema)
+    if use_cache and (cached := _read_cache(key)) is not None:
+        _count(provider, "hits")
+        return schema.model_validate_json(cached)
+    _count(provider, "misses")
+    deltas: Iterator[str] = _provider_function(provider, "stream")(
+        system_prompt, text, schema, model=model, **params
+    )
+    answer = ""
+    parsed = None
+    try:
+        for delta in deltas:
+            answer += delta
+            if until is not None and until in (fields := _complete_fields(answer)):
+                skipped = {
+                    name: ""
+                    for name, field in schema.model_fields.items()
+                    if field.annotation is str
+                }
+                parsed = schema.model_validate({**skipped, **fields})
+                break
+    finally:
+        # closing the stream ends the generation on the provider side
+        deltas.close()
+    if parsed is None:
+        # tolerate a fenced code block around the json
+        start, end = answer.find("{"), answer.rfind("}")
+        parsed = schema.model_validate_json(answer[start : end + 1])
+    _write_cache(key, provider, model, parsed.model_dump_json())
+    return parsed
@@ -0,0 +1,156 @@
+import re
+from functools import partial
+
+from loguru import logger
+
+from src.enums import APIProviderEnum
+from src.utils.llm import batch, dispatcher, gateway
+from src.utils.llm.prompts import MERGE_SUMMARIES
+from src.utils.llm.tokens import count_tokens, split_tokens
+
+# boundaries to split oversized texts at, from the coarsest to the finest.
+# extracted drucksachen are flattened to single spaces, so the structural
+# markers also match after a plain space
+BOUNDARIES = [
+    re.compile(r"\s(?=[A-H]\.\s[A-ZÄÖÜ])"),  # sections of a gesetzentwurf, "A. Problem"
+    re.compile(r"\s(?=Artikel\s\d+\b)"),
+    re.compile(r"\s(?=§\s?\d+\b)"),
+    re.compile(r"\n\s*\n"),
+    re.compile(r"(?<=[.!?:;])\s+"),
+]
+
+
+def _split(text: str, model: str, max_tokens: int, level: int) -> list[str]:
+    if count_tokens(text, model) <= max_tokens:
+        return [text]
+    if level == len(BOUNDARIES):
+        return split_tokens(text, model, max_tokens)
+    pieces = [p for p in BOUNDARIES[level].split(text) if p.strip()]
+    if len(pieces) == 1:
+        return _split(text, model, max_tokens, level + 1)
+    return [
+        chunk
+        for piece in pieces
+        for chunk in _split(piece, model, max_tokens, level + 1)
+    ]
+
+
+def _pack(pieces: list[str], model: str, max_tokens: int, separator: str) -> list[str]:
+    # joins neighbouring pieces as long as they fit into one chunk
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece, model)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def split_text(text: str, model: str, max_tokens: int) -> list[str]:
+    """
+    Splits a text into chunks of at most `max_tokens` tokens of `model`. Texts are
+    cut at the coarsest structural boundary that yields small enough pieces, and
+    neighbouring pieces are joined again up to the limit.
+    """
+    return _pack(_split(text, model, max_tokens, 0), model, max_tokens, " ")
+
+
+def _run(
+    prefix: str,
+    provider: APIProviderEnum,
+    model: str,
+    requests: list[tuple[str, str]],
+    use_batch: bool,
+) -> list[str | None]:
+    if use_batch:
+        results = batch.run_batch(
+            prefix,
+            provider,
+            model,
+            [
+                {"custom_id": str(i), "system_prompt": system_prompt, "text": text}
+                for i, (system_prompt, text) in enumerate(requests)
+            ],
+        )
+        return [results[str(i)] for i in range(len(requests))]
+    return dispatcher.run_calls(
+        [
+            partial(gateway.complete, provider, model, system_prompt, text)
+            for system_prompt, text in requests
+        ],
+        provider,
+        token_counts=[count_tokens(system_prompt + text, model) for system_prompt, text in requests],
+    )
+
+
+def summarize_long(
+    texts: list[str | None],
+    provider: APIProviderEnum,
+    model: str,
+    system_prompt: str,
+    max_tokens: int,
+    use_batch: bool = False,
+    prefix: str = "summaries",
+) -> list[str | None]:
+    """
+    Summarizes texts of any length. Texts that fit into `max_tokens` are sent as
+    one request, longer texts are split with `split_text`, the chunks summarized
+    in parallel and the partial summaries merged level by level until one summary
+    per text is left. All requests of a level go out together, so the latency
+    grows with the number of levels, not with the length of the texts.
+
+    Args:
+        texts: The texts to summarize, None entries are passed through.
+        provider: The API provider to use.
+        model: The model identifier of the provider.
+        system_prompt: The summarization instructions.
+        max_tokens: Token limit of a single chunk.
+        use_batch: Run every level as a batch job instead of live requests.
+        prefix: Name prefix of the batch jobs.
+
+    Returns:
+        One summary per text, None where a request failed.
+    """
+    results: list[str | None] = [None] * len(texts)
+    pending = {
+        i: split_text(text, model, max_tokens) for i, text in enumerate(texts) if text
+    }
+    split_count = sum(1 for chunks in pending.values() if len(chunks) > 1)
+    if split_count:
+        logger.info(f"Splitting {split_count} oversized texts into chunks.")
+
+    prompt, level = system_prompt, 0
+    while pending:
+        requests = [(i, chunk) for i, chunks in pending.items() for chunk in chunks]
+        answers = _run(
+            f"{prefix}-{level}",
+            provider,
+            model,
+            [(prompt, chunk) for _, chunk in requests],
+            use_batch,
+        )
+        summaries: dict[int, list[str | None]] = {}
+        for (i, _), answer in zip(requests, answers):
+            summaries.setdefault(i, []).append(answer)
+
+        pending = {}
+        for i, partial_summaries in summaries.items():
+            if any(summary is None for summary in partial_summaries):
+                logger.error(f"Summarizing text {i} failed at level {level}.")
+            elif len(partial_summaries) == 1:
+                results[i] = partial_summaries[0]
+            else:
+                merged = _pack(partial_summaries, model, max_tokens, "\n\n")
+                if len(merged) == len(partial_summaries):
+                    # summaries too long to pack, merge pairwise so the level still shrinks
+                    merged = [
+                        "\n\n".join(partial_summaries[j : j + 2])
+                        for j in range(0, len(partial_summaries), 2)
+                    ]
+                pending[i] = merged
+        prompt, level = MERGE_SUMMARIES + system_prompt, level + 1
+    return results
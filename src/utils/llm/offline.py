@@ -0,0 +1,424 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import httpx
+import numpy as np
+from loguru import logger
+
+from src import config
+
+# LLM_OFFLINE=synthetic answers every request with generated output,
+# LLM_OFFLINE=replay answers from recorded cassettes and LLM_OFFLINE=record
+# forwards requests to the real api and records the answers
+MODES = {"synthetic", "replay", "record"}
+
+ENDPOINTS = ["chat/completions", "responses", "embeddings", "messages"]
+
+
+def get_mode() -> str | None:
+    mode = os.environ.get("LLM_OFFLINE", "").strip().lower() or None
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"LLM_OFFLINE must be one of {sorted(MODES)}, got {mode}.")
+    return mode
+
+
+def _endpoint(request: httpx.Request) -> str | None:
+    path = request.url.path.rstrip("/")
+    for endpoint in ENDPOINTS:
+        if path.endswith(f"/{endpoint}"):
+            return endpoint
+    return None
+
+
+def _cassette_path(endpoint: str, body: dict) -> Path:
+    payload = json.dumps(body, sort_keys=True, ensure_ascii=False)
+    key = hashlib.sha256(f"{endpoint}\x00{payload}".encode("utf-8")).hexdigest()
+    return Path(config.OFFLINE_CASSETTE_DIR) / endpoint.replace("/", "_") / f"{key}.json"
+
+
+def _seed(*parts: Any) -> int:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "little")
+
+
+def _instance(schema: dict, defs: dict, rng: random.Random) -> Any:
+    # smallest valid instance of a json schema as produced by pydantic
+    if "$ref" in schema:
+        return _instance(defs[schema["$ref"].split("/")[-1]], defs, rng)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    for key in ["anyOf", "oneOf", "allOf"]:
+        if key in schema:
+            return _instance(schema[key][0], defs, rng)
+    schema_type = schema.get("type", "string")
+    if schema_type == "object":
+        return {
+            name: _instance(prop, defs, rng)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [_instance(schema.get("items", {}), defs, rng)]
+    if schema_type == "integer":
+        return max(schema.get("minimum", 0), 0)
+    if schema_type == "number":
+        return 0.0
+    if schema_type == "boolean":
+        return False
+    if schema_type == "null":
+        return None
+    return f"synthetisch-{rng.randrange(16**6):06x}"
+
+
+def _schema_json(schema: dict, seed: int) -> str:
+    return json.dumps(
+        _instance(schema, schema.get("$defs", {}), random.Random(seed)), ensure_ascii=False
+    )
+
+
+def _prompt_schema(messages: list[dict]) -> dict | None:
+    # json mode clients pass the schema as the last json object of the system prompt
+    for message in messages:
+        content = message.get("content")
+        if message.get("role") == "system" and isinstance(content, str):
+            start = content.rfind("\n{")
+            if start != -1:
+                try:
+                    return json.loads(content[start:])
+                except json.JSONDecodeError:
+                    return None
+    return None
+
+
+def _text(messages: list[dict] | str, seed: int) -> str:
+    if isinstance(messages, str):
+        user_text = messages
+    else:
+        contents = [m.get("content") for m in messages if m.get("role") == "user"]
+        user_text = " ".join(
+            c if isinstance(c, str) else " ".join(part.get("text", "") for part in c)
+            for c in contents
+        )
+    words = user_text.split()[: config.OFFLINE_ANSWER_WORDS]
+    return f"Synthetische Antwort {seed % 16**8:08x}: {' '.join(words)}"
+
+
+def _usage(body: dict, answer: str) -> tuple[int, int]:
+    # rough counts, good enough for throughput numbers
+    return len(json.dumps(body, ensure_ascii=False)) // 4 + 1, len(answer) // 4 + 1
+
+
+def _chat_completion(body: dict, seed: int) -> dict:
+    messages = body.get("messages", [])
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        answer = _schema_json(response_format["json_schema"]["schema"], seed)
+    elif response_format.get("type") == "json_object":
+        answer = _schema_json(_prompt_schema(messages) or {"type": "object"}, seed)
+    else:
+        answer = _text(messages, seed)
+    prompt_tokens, completion_tokens = _usage(body, answer)
+    return {
+        "id": f"chatcmpl-offline-{seed:016x}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body.get("model", "offline"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _response(body: dict, seed: int) -> dict:
+    text_format = (body.get("text") or {}).get("format") or {}
+    if text_format.get("type") == "json_schema":
+        answer = _schema_json(text_format["schema"], seed)
+    else:
+        answer = _text(body.get("input", ""), seed)
+    prompt_tokens, completion_tokens = _usage(body, answer)
+    return {
+        "id": f"resp-offline-{seed:016x}",
+        "object": "response",
+        "created_at": 0,
+        "model": body.get("model", "offline"),
+        "status": "completed",
+        "output": [
+            {
+                "id": f"msg-offline-{seed:016x}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": answer, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": prompt_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": completion_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _embeddings(body: dict, seed: int) -> dict:
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dimensions = body.get("dimensions", config.OFFLINE_EMBEDDING_DIMENSIONS)
+    data = []
+    for i, text in enumerate(inputs):
+        # the vector only depends on model and text, so repeated texts embed identically
+        rng = np.random.default_rng(_seed(body.get("model"), text))
+        vector = rng.standard_normal(dimensions).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        embedding = (
+            base64.b64encode(vector.tobytes()).decode("ascii")
+            if body.get("encoding_format") == "base64"
+            else vector.tolist()
+        )
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+    tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", "offline"),
+        "data": data,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def _message(body: dict, seed: int) -> dict:
+    schema = _prompt_schema([{"role": "system", "content": body.get("system")}])
+    answer = (
+        _schema_json(schema, seed) if schema else _text(body.get("messages", []), seed)
+    )
+    prompt_tokens, completion_tokens = _usage(body, answer)
+    return {
+        "id": f"msg_offline_{seed:016x}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "offline"),
+        "content": [{"type": "text", "text": answer}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+    }
+
+
+_SYNTHETIC = {
+    "chat/completions": _chat_completion,
+    "responses": _response,
+    "embeddings": _embeddings,
+    "messages": _message,
+}
+
+
+def _pieces(answer: str) -> list[str]:
+    # roughly one token per piece
+    return [answer[i : i + 4] for i in range(0, len(answer), 4)]
+
+
+def _chat_completion_events(completion: dict) -> Iterator[str]:
+    chunk = {key: completion[key] for key in ["id", "created", "model"]}
+    chunk["object"] = "chat.completion.chunk"
+    for piece in _pieces(completion["choices"][0]["message"]["content"]):
+        delta = {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+        yield f"data: {json.dumps({**chunk, 'choices': [delta]}, ensure_ascii=False)}\n\n"
+    done = {"index": 0, "delta": {}, "finish_reason": "stop"}
+    yield f"data: {json.dumps({**chunk, 'choices': [done]})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def _message_events(message: dict) -> Iterator[str]:
+    def event(data: dict) -> str:
+        return f"event: {data['type']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    yield event({"type": "message_start", "message": {**message, "content": []}})
+    yield event(
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+    )
+    for piece in _pieces(message["content"][0]["text"]):
+        yield event(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": piece},
+            }
+        )
+    yield event({"type": "content_block_stop", "index": 0})
+    yield event(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": message["usage"]["output_tokens"]},
+        }
+    )
+    yield event({"type": "message_stop"})
+
+
+_SYNTHETIC_EVENTS = {
+    "chat/completions": _chat_completion_events,
+    "messages": _message_events,
+}
+
+
+def _paced(events: Iterator[str]) -> Iterator[bytes]:
+    # the stream is generated lazily, so a client that closes it early saves the rest
+    for event in events:
+        time.sleep(config.OFFLINE_TOKEN_LATENCY)
+        yield event.encode("utf-8")
+
+
+class OfflineTransport(httpx.BaseTransport):
+    """
+    httpx transport that stands in for the OpenAI compatible chat completions,
+    responses and embeddings apis and the Anthropic messages api. Depending on
+    the mode it generates deterministic answers, replays recorded cassettes or
+    records the answers of the real api into cassettes.
+
+    Every answer is delayed by `config.OFFLINE_LATENCY` seconds plus up to
+    `config.OFFLINE_LATENCY_JITTER` seconds until the first token and
+    `config.OFFLINE_TOKEN_LATENCY` seconds per generated token; chat completions
+    and messages can be streamed. With `config.OFFLINE_MAX_CONCURRENCY`
+    set, requests above that many in flight are rejected with 429 and a
+    Retry-After header, like a rate limited api.
+    """
+
+    def __init__(self, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown offline mode {mode}.")
+        self.mode = mode
+        self.upstream = httpx.HTTPTransport() if mode == "record" else None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _enter(self) -> bool:
+        with self._lock:
+            if (
+                config.OFFLINE_MAX_CONCURRENCY is not None
+                and self._in_flight >= config.OFFLINE_MAX_CONCURRENCY
+            ):
+                return False
+            self._in_flight += 1
+            return True
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request)
+        if endpoint is None or request.method != "POST":
+            return httpx.Response(
+                404, json={"error": {"message": f"{request.url.path} is not available offline."}}
+            )
+        body = json.loads(request.read() or b"{}")
+        if self.mode == "record":
+            return self._record(request, endpoint, body)
+        if not self._enter():
+            return httpx.Response(
+                429,
+                headers={"retry-after": "1"},
+                json={"error": {"message": "Offline concurrency limit reached."}},
+            )
+        try:
+            seed = _seed(endpoint, body)
+            time.sleep(
+                config.OFFLINE_LATENCY
+                + random.Random(seed).uniform(0, config.OFFLINE_LATENCY_JITTER)
+            )
+            if self.mode == "replay":
+                return self._replay(endpoint, body)
+            answer = _SYNTHETIC[endpoint](body, seed)
+            if body.get("stream"):
+                if endpoint not in _SYNTHETIC_EVENTS:
+                    return httpx.Response(
+                        400, json={"error": {"message": f"{endpoint} cannot stream offline."}}
+                    )
+                return httpx.Response(
+                    200,
+                    headers={"content-type": "text/event-stream"},
+                    content=_paced(_SYNTHETIC_EVENTS[endpoint](answer)),
+                )
+            completion_tokens = answer.get("usage", {}).get(
+                "completion_tokens", answer.get("usage", {}).get("output_tokens", 0)
+            )
+            time.sleep(completion_tokens * config.OFFLINE_TOKEN_LATENCY)
+            return httpx.Response(200, json=answer)
+        finally:
+            self._exit()
+
+    def _replay(self, endpoint: str, body: dict) -> httpx.Response:
+        path = _cassette_path(endpoint, body)
+        if not path.exists():
+            return httpx.Response(
+                404, json={"error": {"message": f"No cassette recorded at {path}."}}
+            )
+        cassette = json.loads(path.read_text(encoding="utf-8"))
+        return httpx.Response(
+            cassette["status_code"],
+            content=cassette["body"].encode("utf-8"),
+            headers={"content-type": cassette.get("content_type", "application/json")},
+        )
+
+    def _record(self, request: httpx.Request, endpoint: str, body: dict) -> httpx.Response:
+        response = self.upstream.handle_request(request)
+        content = response.read()
+        if response.status_code == 200:
+            path = _cassette_path(endpoint, body)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(
+                json.dumps(
+                    {
+                        "status_code": response.status_code,
+                        "content_type": response.headers.get("content-type", "application/json"),
+                        "body": content.decode("utf-8"),
+                    },
+                    ensure_ascii=False,
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp_path, path)
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() not in {"content-encoding", "content-length", "transfer-encoding"}
+        }
+        return httpx.Response(response.status_code, content=content, headers=headers)
+
+
+def client_options() -> dict[str, Any]:
+    """
+    Keyword arguments for the api clients. Empty unless `LLM_OFFLINE` is set, then
+    requests go through an `OfflineTransport` and, unless recording, a placeholder
+    api key is used.
+    """
+    mode = get_mode()
+    if mode is None:
+        return {}
+    logger.info(f"LLM clients run offline in {mode} mode.")
+    options: dict[str, Any] = {
+        "http_client": httpx.Client(transport=OfflineTransport(mode), timeout=None)
+    }
+    if mode != "record":
+        options["api_key"] = "offline"
+    return options
@@ -1,74 +1,77 @@
-from typing import List
+import threading
+from functools import cache
+from typing import Iterator
 
 from dotenv import load_dotenv
 from openai import OpenAI
 from pydantic import BaseModel
 
-from src.utils.llm import prompts
-from src.votes import config
+from src.utils.llm import dispatcher, offline
 
-load_dotenv()
-client = OpenAI()
+_client_lock = threading.Lock()
 
 
-def prompt_openai(system_prompt: str, text: str, model: str = "gpt-4.1-mini") -> str:
-    response = client.chat.completions.create(
+@cache
+def _create_client(max_retries: int) -> OpenAI:
+    load_dotenv()
+    return OpenAI(max_retries=max_retries, **offline.client_options())
+
+
+def get_client() -> OpenAI:
+    # the lock keeps concurrent first calls from constructing several clients
+    with _client_lock:
+        return _create_client(dispatcher.client_max_retries())
+
+
+def prompt_openai(
+    system_prompt: str, text: str, model: str = "gpt-4.1-mini", **params
+) -> str:
+    response = get_client().chat.completions.create(
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": text},
         ],
         model=model,
+        **params,
     )
     return response.choices[0].message.content
 
 
-class MatchingTitle(BaseModel):
-    index: int
-
-
-def match_drucksache_to_vote(
-    vote_title: str, available_drucksachen: list[dict]
-) -> MatchingTitle:
-    response = client.responses.parse(
-        model="gpt-4.1-mini",
+def parse_openai(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "gpt-4.1-mini",
+    **params,
+) -> BaseModel:
+    response = get_client().responses.parse(
+        model=model,
         input=[
-            {
-                "role": "system",
-                "content": prompts.MATCH_ENTRYPOINT,
-            },
-            {
-                "role": "user",
-                "content": f"Vote title: {vote_title}\nAvailable drucksachen: {available_drucksachen}",
-            },
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text},
         ],
-        text_format=MatchingTitle,
+        text_format=schema,
+        **params,
     )
+    return response.output_parsed
 
-    event = response.output_parsed
-    return event
-
-
-def get_embedding(text: str, model=config.EMBEDDING_MODEL) -> list[float]:
-    response = client.embeddings.create(input=text, model=model)
-    return response.data[0].embedding
 
-
-
-class VoteProposers(BaseModel):
-    proposers: List[str]
-
-
-def get_proposer(
-    vote_title: str
-) -> VoteProposers:
-    response = client.responses.parse(
-        model="gpt-4.1-mini",
-        input=[
-            {"role": "system", "content": prompts.GET_PROPOSER},
-            {"role": "user", "content": f"Vote title: {vote_title}"},
+def stream_openai(
+    system_prompt: str,
+    text: str,
+    schema: type[BaseModel],
+    model: str = "gpt-4.1-mini",
+    **params,
+) -> Iterator[str]:
+    with get_client().chat.completions.stream(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text},
         ],
-        text_format=VoteProposers,
-    )
-
-    event = response.output_parsed.proposers
-    return event
+        response_format=schema,
+        **params,
+    ) as stream:
+        for event in stream:
+            if event.type == "content.delta":
+                yield event.delta
@@ -33,4 +33,10 @@ GET_PROPOSER = f"""
     Es können mehrere Parteien zusammen Antragssteller sein, gebe also alle Parteien als Liste zurück.
     Ist es nicht möglich, aus dem Text Parteien zu identifizieren, gebe eine leere Liste zurück.
     Dies sind die möglichen Parteien die du zurückgeben kannst: {', '.join(config.PROPOSERS.keys())}.
-"""
\ No newline at end of file
+"""
+
+MERGE_SUMMARIES = """
+    Die folgenden Texte sind Zusammenfassungen aufeinanderfolgender Abschnitte desselben Dokuments.
+    Führe sie zu einer einzigen Zusammenfassung des ganzen Dokuments zusammen, ohne Wiederholungen.
+    Halte dich dabei an die folgenden Vorgaben für die Zusammenfassung:
+"""
@@ -0,0 +1,80 @@
+from typing import Any, List, Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+from src.prediction.config import REASONING_MAX_CHARS
+
+
+class MatchingTitle(BaseModel):
+    index: int
+
+
+class VoteProposers(BaseModel):
+    proposers: List[str]
+
+
+Decision = Literal["stimmt zu", "stimmt nicht zu", "enthält sich"]
+
+
+class PredictionDecision(BaseModel):
+    # the decision comes first, so it is complete after the first streamed tokens
+    decision: Decision
+    # required, as strict structured outputs allow no defaults
+    reasoning: str = Field(
+        description=f"Kurze Begründung mit höchstens {REASONING_MAX_CHARS} Zeichen.",
+    )
+
+    @field_validator("reasoning")
+    @classmethod
+    def truncate_reasoning(cls, reasoning: str) -> str:
+        return reasoning[:REASONING_MAX_CHARS]
+
+
+class PackedDecision(BaseModel):
+    # the number comes first, so every decision is anchored to its antrag
+    antrag: int = Field(description="Nummer des Antrags.")
+    decision: Decision
+    reasoning: str = Field(
+        description=f"Kurze Begründung mit höchstens {REASONING_MAX_CHARS} Zeichen.",
+    )
+
+    @field_validator("reasoning")
+    @classmethod
+    def truncate_reasoning(cls, reasoning: str) -> str:
+        return reasoning[:REASONING_MAX_CHARS]
+
+
+class PackedPredictionDecisions(BaseModel):
+    decisions: List[PackedDecision]
+
+
+def _strict(schema: dict[str, Any]) -> dict[str, Any]:
+    # strict mode wants every property required and no defaults
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema.get("properties", {}))
+        for prop in schema.get("properties", {}).values():
+            prop.pop("default", None)
+    for value in schema.values():
+        if isinstance(value, dict):
+            _strict(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    _strict(item)
+    return schema
+
+
+def response_format(schema: type[BaseModel]) -> dict[str, Any]:
+    """
+    Strict json schema response format of the chat completions api, for requests
+    that are not sent through the client's parse helpers, e.g. batch jobs.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": schema.__name__,
+            "schema": _strict(schema.model_json_schema()),
+            "strict": True,
+        },
+    }
@@ -0,0 +1,59 @@
+from functools import cache
+
+import tiktoken
+from loguru import logger
+
+from src.utils.llm import offline
+
+# characters per token assumed by `estimate_tokens`
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    # german text averages well above three characters per token
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@cache
+def get_encoding(model: str) -> tiktoken.Encoding | None:
+    """
+    Returns the tokenizer of a model, or None if it is not available. tiktoken
+    downloads encodings on first use unless they are in `TIKTOKEN_CACHE_DIR`, so
+    without network access, or with LLM_OFFLINE answering from the stand-in,
+    tokens are estimated from the text length instead.
+    """
+    if offline.get_mode() in {"synthetic", "replay"}:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # models of other providers have no public tokenizer, the current openai
+            # encoding is close enough for budgeting
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"No tokenizer for {model} ({e}), estimating token counts.")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_tokens(text: str, model: str, max_tokens: int) -> list[str]:
+    """
+    Cuts a text into pieces of at most `max_tokens` tokens, ignoring its structure.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        # pieces whose estimate is at most max_tokens
+        size = max(1, (max_tokens - 1) * CHARS_PER_TOKEN)
+        return [text[start : start + size] for start in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [
+        encoding.decode(tokens[start : start + max_tokens])
+        for start in range(0, len(tokens), max_tokens)
+    ]
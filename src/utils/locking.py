@@ -0,0 +1,36 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def file_lock(lock_path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on `lock_path` for the duration of the context. The lock
+    is shared between processes and threads, so it can guard files that several
+    workers write to.
+
+    Args:
+        lock_path: Path of the lock file. It is created if it does not exist.
+    """
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.utils.locking import file_lock
+
+
+class DownloadManifest:
+    """
+    Records what is known about every downloaded file: source URL, size, ETag and
+    Last-Modified headers, sha256 and whether the file passed validation.
+
+    The manifest is an append-only JSON lines file in which the last line for a path
+    wins, so concurrent writers only ever append. It is compacted when it has grown
+    to more than twice the number of entries.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._lines = 0
+        self._read_bytes = 0
+        self._refresh()
+        if self._lines > 2 * len(self._entries) + 100:
+            self._compact()
+
+    def _refresh(self) -> None:
+        if not self.path.exists() or self.path.stat().st_size == self._read_bytes:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._read_bytes)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # line that is still being written
+                    break
+                self._read_bytes += len(line)
+                self._lines += 1
+                entry = json.loads(line)
+                self._entries[entry["path"]] = entry
+
+    def _compact(self) -> None:
+        with file_lock(f"{self.path}.lock"):
+            self._refresh()
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+            self._read_bytes = self.path.stat().st_size
+
+    def get(self, file_path: str) -> dict | None:
+        with self._lock:
+            self._refresh()
+            return self._entries.get(Path(file_path).as_posix())
+
+    def update(self, file_path: str, **fields) -> dict:
+        key = Path(file_path).as_posix()
+        with self._lock, file_lock(f"{self.path}.lock"):
+            self._refresh()
+            entry = {
+                **self._entries.get(key, {}),
+                **fields,
+                "path": key,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._refresh()
+            return entry
+
+    def is_valid(self, file_path: str) -> bool:
+        """
+        Whether the file at `file_path` was validated and has not changed size since.
+        """
+        entry = self.get(file_path)
+        if not entry or not entry.get("valid"):
+            return False
+        try:
+            return os.stat(file_path).st_size == entry.get("size")
+        except FileNotFoundError:
+            return False
@@ -1,4 +1,12 @@
+import gzip
+import hashlib
+import os
+import pickle
 import re
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Iterator
 from time import sleep
 
 import pandas as pd
@@ -7,6 +15,11 @@ import requests
 from loguru import logger
 from tqdm import tqdm
 
+from src import config
+
+# content hashes of already seen files, keyed by (path, mtime, size)
+_file_hashes: dict[tuple[str, int, int], str] = {}
+
 
 def extract_first_page(pdf_path: str, opt="text"):
     """
@@ -42,3 +55,143 @@ def extract_content(path: str, opt="text") -> str | list[tuple]:
                 blocks = sorted(page.get_text("blocks"), key=lambda x: x[1])
                 all_blocks.extend(blocks)
             return all_blocks
+
+
+def _open(source: str | bytes) -> pymupdf.Document:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pymupdf.open(stream=source, filetype="pdf")
+    return pymupdf.open(source)
+
+
+def file_hash(pdf_path: str | bytes) -> str:
+    """
+    Returns the sha256 hex digest of a file, memoized per path, mtime and size.
+    In-memory documents are hashed directly.
+    """
+    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(pdf_path).hexdigest()
+    stat = os.stat(pdf_path)
+    key = (str(pdf_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        with open(pdf_path, "rb") as f:
+            _file_hashes[key] = hashlib.file_digest(f, "sha256").hexdigest()
+    return _file_hashes[key]
+
+
+def _page_content(page: pymupdf.Page, opt: str) -> str | list[tuple]:
+    content = page.get_text(opt)
+    if opt == "blocks":
+        content = sorted(content, key=lambda x: x[1])
+    return content
+
+
+def _cache_path(digest: str, opt: str) -> Path:
+    return Path(config.PDF_CACHE_DIR) / digest[:2] / f"{digest}_{opt}.pkl.gz"
+
+
+def _read_cache(cache_path: Path) -> tuple[int, list] | None:
+    # the page count of the document and the pages parsed so far
+    if not cache_path.exists():
+        return None
+    try:
+        with gzip.open(cache_path, "rb") as f:
+            entry = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable cache entry {cache_path}: {e}")
+        cache_path.unlink(missing_ok=True)
+        return None
+    # entries written before partial documents were cached hold all pages
+    if isinstance(entry, list):
+        return len(entry), entry
+    return entry
+
+
+def _write_cache(cache_path: Path, page_count: int, pages: list) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file first so concurrent readers never see partial entries
+    tmp_path = cache_path.with_name(
+        f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+        pickle.dump((page_count, pages), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def iter_pages(pdf_path: str | bytes, opt="text") -> Iterator[str | list[tuple]]:
+    """
+    Lazily yields the content of a PDF file one page at a time, so callers can stop
+    reading once they found what they need. Pages are served from the on-disk cache
+    as far as they were parsed before, the rest is parsed and the pages read so far
+    are added to the cache when the iterator is exhausted or closed.
+
+    Args:
+        pdf_path: The path to the PDF file or its content.
+        opt: The pymupdf extraction option, e.g. "text" or "blocks".
+
+    Yields:
+        The content of each page. Blocks are sorted by their y coordinate.
+    """
+    cache_path = _cache_path(file_hash(pdf_path), opt)
+    entry = _read_cache(cache_path)
+    page_count, cached = entry or (None, [])
+    yield from cached
+    if len(cached) == page_count:
+        return
+
+    pages = list(cached)
+    try:
+        with _open(pdf_path) as doc:
+            page_count = doc.page_count
+            for number in range(len(pages), page_count):
+                content = _page_content(doc[number], opt)
+                pages.append(content)
+                yield content
+    finally:
+        # also runs when the caller stops early and the iterator is closed
+        if page_count is not None and (entry is None or len(pages) > len(cached)):
+            _write_cache(cache_path, page_count, pages)
+
+
+def get_pages(pdf_path: str | bytes, opt="text") -> list[str | list[tuple]]:
+    """
+    Returns the per-page content of a PDF file. Pages are parsed once per file hash
+    and extraction option and then served from the on-disk cache.
+
+    Args:
+        pdf_path: The path to the PDF file or its content.
+        opt: The pymupdf extraction option, e.g. "text" or "blocks".
+
+    Returns:
+        A list with the content of every page. Blocks are sorted by their y coordinate.
+    """
+    return list(iter_pages(pdf_path, opt))
+
+
+def iter_blocks(pdf_path: str | bytes) -> Iterator[tuple]:
+    """
+    Lazily yields the y-sorted blocks of a PDF file, page by page.
+    """
+    with closing(iter_pages(pdf_path, "blocks")) as pages:
+        for page in pages:
+            yield from page
+
+
+def read_first_page(pdf_path: str | bytes, opt="text") -> str | list[tuple] | None:
+    """
+    Cached equivalent of `extract_first_page`, which parses only the first page.
+    """
+    with closing(iter_pages(pdf_path, opt)) as pages:
+        first = next(pages, None)
+    if first is None:
+        logger.error(f"PDF file {pdf_path} has no pages.")
+    return first
+
+
+def read_content(pdf_path: str | bytes, opt="text") -> str | list[tuple]:
+    """
+    Cached equivalent of `extract_content`.
+    """
+    pages = get_pages(pdf_path, opt)
+    if opt == "text":
+        return re.sub(r"\s+", " ", "\n".join(pages)).strip()
+    return [block for page in pages for block in page]
@@ -0,0 +1,59 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to
+    `capacity`; `acquire` blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Takes `tokens` if available without blocking.
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until they will be.
+        """
+        # requests larger than the bucket would never fit, so they drain it completely
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while wait := self.reserve(tokens):
+            time.sleep(wait)
+
+
+_host_buckets: dict[str, TokenBucket] = {}
+_host_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(url: str, rate: float, capacity: float | None = None) -> TokenBucket:
+    """
+    Returns the token bucket shared by all requests to the host of `url`.
+    """
+    host = urlparse(url).netloc
+    with _host_buckets_lock:
+        if host not in _host_buckets:
+            _host_buckets[host] = TokenBucket(rate, capacity)
+        return _host_buckets[host]
@@ -0,0 +1,183 @@
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src import config
+
+
+def to_matrix(embeddings: Iterable) -> np.ndarray:
+    """
+    Stacks row embeddings (lists or arrays) into a contiguous (n, dim) float32 matrix.
+    """
+    if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2:
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows = list(embeddings)
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack([np.asarray(row, dtype=np.float32) for row in rows])
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scales every row of a float32 matrix to unit length, leaving zero rows as is.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def truncate_dimensions(matrix: np.ndarray, dimensions: int | None) -> np.ndarray:
+    """
+    Keeps the first `dimensions` dimensions of every row and scales the rows back
+    to unit length. Embeddings of the text-embedding-3 models are trained so that
+    such prefixes remain usable (Matryoshka representation).
+    """
+    if dimensions is None or dimensions >= matrix.shape[1]:
+        return matrix
+    return normalize_rows(np.ascontiguousarray(matrix[:, :dimensions]))
+
+
+class QuantizedMatrix:
+    """
+    Rows of an embedding matrix as int8 codes with one float32 scale per row, so
+    a row takes a quarter of its float32 size plus four bytes. Build it once with
+    `from_matrix` and drop the float32 matrix; only the codes are kept.
+
+    NumPy has no int8 matrix product, so `similarities` expands one block of
+    `config.QUANTIZED_BLOCK_ROWS` codes at a time to float32 for the multiply. The
+    scan therefore costs as much as on a float32 matrix of the same dimensions;
+    quantization saves memory, truncating dimensions saves time.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, dimensions: int | None = None) -> "QuantizedMatrix":
+        matrix = truncate_dimensions(normalize_rows(to_matrix(matrix)), dimensions)
+        scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.empty(0)
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return cls(codes, scales)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        # only one float32 block of codes exists at a time
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), config.QUANTIZED_BLOCK_ROWS):
+            end = start + config.QUANTIZED_BLOCK_ROWS
+            block = self.codes[start:end].astype(np.float32)
+            scores[:, start:end] = (queries @ block.T) * self.scales[start:end]
+        return scores
+
+
+SearchMatrix = np.ndarray | QuantizedMatrix
+
+
+def search_matrix(
+    matrix: np.ndarray,
+    quantization: str | None = config.EMBEDDING_QUANTIZATION,
+    dimensions: int | None = config.EMBEDDING_SEARCH_DIMENSIONS,
+) -> SearchMatrix:
+    """
+    Returns the unit-length rows of `matrix` in the representation that is
+    searched: float32, or int8 codes with `quantization="int8"`, optionally
+    truncated to the first `dimensions` dimensions. The result does not reference
+    `matrix`, so callers build it once and keep only the result.
+    """
+    if quantization == "int8":
+        return QuantizedMatrix.from_matrix(matrix, dimensions)
+    if quantization is not None:
+        raise ValueError(f"Unknown embedding quantization {quantization}.")
+    return truncate_dimensions(normalize_rows(to_matrix(matrix)), dimensions)
+
+
+def similarities(queries: np.ndarray, matrix: SearchMatrix) -> np.ndarray:
+    """
+    Returns the (n_queries, n_rows) dot products of the queries with the rows of a
+    float32 or quantized matrix. Queries are truncated to the matrix dimensions.
+    """
+    queries = to_matrix(queries)
+    queries = truncate_dimensions(queries, matrix.shape[1]) if len(matrix) else queries
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.similarities(queries)
+    return queries @ matrix.T
+
+
+def top_k(queries: np.ndarray, matrix: SearchMatrix, k: int) -> np.ndarray:
+    """
+    Returns the row indices of the `k` rows of `matrix` with the highest dot
+    product for every query row, highest first, as an (n_queries, k) array.
+    """
+    k = min(k, len(matrix))
+    if k == 0:
+        return np.empty((len(queries), 0), dtype=np.int64)
+    scores = similarities(queries, matrix)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _fixed_size_list(matrix: np.ndarray) -> pa.FixedSizeListArray:
+    return pa.FixedSizeListArray.from_arrays(
+        pa.array(matrix.reshape(-1), type=pa.float32()), matrix.shape[1]
+    )
+
+
+def write_parquet(df: pd.DataFrame, path: str, embedding_columns: list[str]) -> None:
+    """
+    Writes `df` to parquet, storing the embedding columns as fixed-width float32
+    lists so they can be read back as one matrix.
+    """
+    table = pa.Table.from_pandas(
+        df.drop(columns=embedding_columns), preserve_index=False
+    )
+    for column in embedding_columns:
+        table = table.append_column(column, _fixed_size_list(to_matrix(df[column])))
+    pq.write_table(table.select(list(df.columns)), path)
+
+
+def read_embedding_matrix(path: str, column: str) -> np.ndarray:
+    """
+    Reads an embedding column of a parquet file as an (n, dim) float32 matrix.
+    Columns written by `write_parquet` are returned as a zero-copy view of the
+    memory-mapped arrow buffer, older list-of-floats columns are converted.
+    """
+    array = (
+        pq.read_table(path, columns=[column], memory_map=True)
+        .column(column)
+        .combine_chunks()
+    )
+    if pa.types.is_fixed_size_list(array.type) and pa.types.is_float32(
+        array.type.value_type
+    ):
+        return array.flatten().to_numpy(zero_copy_only=True).reshape(
+            -1, array.type.list_size
+        )
+    return to_matrix(array.to_numpy(zero_copy_only=False))
+
+
+def read_parquet(path: str, embedding_columns: list[str]) -> pd.DataFrame:
+    """
+    Reads a parquet file whose embedding columns hold row views into one float32
+    matrix per column instead of separately allocated arrays.
+    """
+    columns = [c for c in pq.read_schema(path).names if c not in embedding_columns]
+    df = pd.read_parquet(path, columns=columns)
+    for column in embedding_columns:
+        df[column] = list(read_embedding_matrix(path, column))
+    return df
@@ -1,24 +1,40 @@
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import TypedDict
+from typing import Iterable, TypedDict
 
 import pandas as pd
 from loguru import logger
 from tqdm import tqdm
 
 from src.drucksachen import beschlussempfehlung, extract
-from src.drucksachen.access import assert_drucksache_download
+from src.drucksachen.access import (
+    assert_drucksache_download,
+    download_drucksachen,
+    get_drucksache_hash,
+)
 from src.drucksachen.parse import extract_title_from_drucksache
-from src.utils import regex
-from src.utils.download import download_file
-from src.utils.llm import openai_client
+from src.utils import regex, vectors
+from src.utils.download import download_files
+from src.utils.llm import gateway, prompts
+from src.utils.llm.embeddings import embed_texts
 from src.votes import config
-from src.votes.calculate_result import calculate_vote_result
+from src.votes.calculate_result import calculate_vote_result, get_result_path
 from src.votes.get_entrypoint import get_entrypoint
 from src.votes.parse import get_vote_title
-from src.votes.pdf import get_vote, get_vote_path
+from src.votes.result_store import get_result_store
+from src.votes.proposers import resolve_proposers
+from src.votes.pdf import download_vote_pdf, get_vote, get_vote_path, is_vote_downloaded
 from src.votes.summarize import summarize_texts
 
 
+# columns of the output that are derived from a row's drucksache through the llm
+DERIVED_COLUMNS = ["content", "summary", "summary_embedding", "proposers"]
+
+
 class VoteEntrypointDict(TypedDict):
     vote_id: str
     title: str
@@ -30,6 +46,7 @@ class VoteEntrypointDict(TypedDict):
 def download_vote_documents(vote: pd.Series) -> pd.DataFrame:
     vote_text = get_vote(vote["vote_id"], opt="text", first_page_only=True)
     relevant_ids = regex.regex_drucksachen_ids(vote_text)
+    download_drucksachen(relevant_ids)
 
     success = []
     for relevant_id in relevant_ids:
@@ -49,10 +66,25 @@ def download_vote_documents(vote: pd.Series) -> pd.DataFrame:
     return pd.DataFrame(success)
 
 
+def prefetch_vote_documents(urls: pd.DataFrame) -> None:
+    """
+    Downloads the result pdf and xls files of all votes concurrently.
+    """
+    downloads = []
+    for _, row in urls.iterrows():
+        Path(f"data/votes/all/{row['vote_id']}").mkdir(parents=True, exist_ok=True)
+        if not is_vote_downloaded(row["vote_id"]):
+            downloads.append((row["pdf_url"], get_vote_path(row["vote_id"])))
+        downloads.append((row["xls_url"], get_result_path(row["vote_id"], row["xls_url"])))
+    failures = download_files(downloads)
+    if failures:
+        logger.warning(f"{len(failures)} vote documents could not be downloaded.")
+
+
 def build_vote(row: pd.Series) -> VoteEntrypointDict:
     # Calculate the voting result for each vote
     Path(f"data/votes/all/{row['vote_id']}").mkdir(parents=True, exist_ok=True)
-    download_file(row["pdf_url"], get_vote_path(row["vote_id"]))
+    download_vote_pdf(row["vote_id"], row["pdf_url"])
     calculate_vote_result(row["vote_id"], row["xls_url"])
 
     vote_title = get_vote_title(row["vote_id"])
@@ -80,29 +112,114 @@ def build_vote(row: pd.Series) -> VoteEntrypointDict:
     }
 
 
-def build_entrypoints(force_regenerate: bool = False) -> pd.DataFrame:
-    if not force_regenerate and Path(config.ENTRYPOINTS_PARQUET_PATH).exists():
-        logger.info("Loading existing entrypoints...")
-        return pd.read_parquet(config.ENTRYPOINTS_PARQUET_PATH)
+def load_entrypoint_checkpoints() -> pd.DataFrame:
+    checkpoint_folder = Path(config.ENTRYPOINT_CHECKPOINT_FOLDER)
+    parts = sorted(checkpoint_folder.glob("part-*.parquet"))
+    if not parts:
+        return pd.DataFrame(columns=list(VoteEntrypointDict.__annotations__) + ["vote_num"])
+    return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+
+def write_entrypoint_checkpoint(entrypoints: list[VoteEntrypointDict]) -> None:
+    if not entrypoints:
+        return
+    # results of checkpointed votes have to be on disk before the votes count as done
+    get_result_store().flush()
+    part_path = Path(config.ENTRYPOINT_CHECKPOINT_FOLDER) / f"part-{time.time_ns()}.parquet"
+    tmp_path = part_path.with_suffix(".tmp")
+    pd.DataFrame(entrypoints).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, part_path)
+
+
+def load_entrypoint_failures() -> pd.DataFrame:
+    if not Path(config.ENTRYPOINT_FAILURES_PATH).exists():
+        return pd.DataFrame(columns=["vote_id", "error"])
+    return pd.read_parquet(config.ENTRYPOINT_FAILURES_PATH)
+
+
+def write_entrypoint_failures(failures: pd.DataFrame) -> None:
+    failures.to_parquet(config.ENTRYPOINT_FAILURES_PATH, index=False)
+
+
+def build_entrypoints(
+    force_regenerate: bool = False,
+    retry_failed: bool = False,
+    workers: int = config.ENTRYPOINT_WORKERS,
+) -> pd.DataFrame:
+    """
+    Builds the entrypoint of every scraped vote on a thread pool. Finished votes are
+    checkpointed in batches to `config.ENTRYPOINT_CHECKPOINT_FOLDER` and skipped on
+    the next run, failed votes are recorded in `config.ENTRYPOINT_FAILURES_PATH`.
+
+    Args:
+        force_regenerate: Discard all checkpoints and failures and start over.
+        retry_failed: Also build the votes that failed in earlier runs.
+        workers: Number of votes built concurrently.
+
+    Returns:
+        The entrypoints of all successfully built votes.
+    """
+    checkpoint_folder = Path(config.ENTRYPOINT_CHECKPOINT_FOLDER)
+    if force_regenerate:
+        shutil.rmtree(checkpoint_folder, ignore_errors=True)
+        Path(config.ENTRYPOINT_FAILURES_PATH).unlink(missing_ok=True)
+    checkpoint_folder.mkdir(parents=True, exist_ok=True)
+    if (
+        not force_regenerate
+        and not any(checkpoint_folder.glob("part-*.parquet"))
+        and Path(config.ENTRYPOINTS_PARQUET_PATH).exists()
+    ):
+        logger.info("Using existing entrypoints as checkpoint...")
+        shutil.copy(config.ENTRYPOINTS_PARQUET_PATH, checkpoint_folder / "part-0.parquet")
 
     urls = pd.read_parquet(config.URLS_PARQUET_PATH)
+    done = set(load_entrypoint_checkpoints()["vote_id"])
+    failures = load_entrypoint_failures()
+    failures = failures[~failures["vote_id"].isin(done)]
+    skip = done if retry_failed else done | set(failures["vote_id"])
+    pending = urls[~urls["vote_id"].isin(skip)]
+    if retry_failed:
+        failures = failures.iloc[0:0]
+    logger.info(
+        f"{len(done)} entrypoints already built, {len(failures)} failed earlier, "
+        f"{len(pending)} to build."
+    )
 
+    if not pending.empty:
+        logger.info("Downloading vote documents...")
+        prefetch_vote_documents(pending)
+
+        logger.info("Calculating vote results...")
+        batch: list[VoteEntrypointDict] = []
+        new_failures = []
+        with (
+            ThreadPoolExecutor(max_workers=workers) as pool,
+            tqdm(total=len(pending), desc="Building vote entrypoints", unit="vote") as pbar,
+        ):
+            futures = {
+                pool.submit(build_vote, row): row["vote_id"]
+                for _, row in pending.iterrows()
+            }
+            for future in as_completed(futures):
+                vote_id = futures[future]
+                try:
+                    batch.append(future.result())
+                except Exception as e:
+                    logger.error(f"Error building vote {vote_id}: {e}")
+                    new_failures.append({"vote_id": vote_id, "error": str(e)})
+                if len(batch) >= config.ENTRYPOINT_CHECKPOINT_EVERY:
+                    write_entrypoint_checkpoint(batch)
+                    batch = []
+                pbar.update(1)
+        write_entrypoint_checkpoint(batch)
+        failures = pd.concat([failures, pd.DataFrame(new_failures)], ignore_index=True)
+        write_entrypoint_failures(failures)
+        if not failures.empty:
+            logger.warning(
+                f"{len(failures)} votes failed, rerun with retry_failed=True to retry them."
+            )
 
-    logger.info("Calculating vote results...")
-    entrypoints: VoteEntrypointDict = []
-    with tqdm(
-        total=len(urls),
-        desc="Building vote entrypoints",
-        unit="vote",
-    ) as pbar:
-        for _, row in urls.iterrows():
-            try:
-                entrypoint = build_vote(row)
-                entrypoints.append(entrypoint)
-            except Exception as e:
-                logger.error(f"Error building vote {row['vote_id']}: {e}")
-            pbar.update(1)
-    entrypoints_df = pd.DataFrame(entrypoints)
+    entrypoints_df = load_entrypoint_checkpoints()
     entrypoints_df.to_parquet(config.ENTRYPOINTS_PARQUET_PATH, index=False)
     return entrypoints_df
 
@@ -155,28 +272,58 @@ def combine_entrypoints_and_beschlussempfehlungen(
     return all_votes
 
 
-def extract_content(row: pd.Series) -> str | None:
-    druck_id = row["drucksache_id"]
-    if row["type"] == "Gesetzentwurf":
+def extract_drucksache_content(druck_id: str, type_: str) -> str | None:
+    if type_ == "Gesetzentwurf":
         return extract.gesetzentwurf(druck_id)
-    if row["type"] in {"Antrag", "Änderungsantrag", "Entschließungsantrag"}:
+    if type_ in {"Antrag", "Änderungsantrag", "Entschließungsantrag"}:
         return extract.antrag(druck_id)
-    logger.error(f"Unknown type {row['type']} in {druck_id}")
+    logger.error(f"Unknown type {type_} in {druck_id}")
     return None
 
 
+def _extract_content_safe(pair: tuple[str, str]) -> str | None:
+    druck_id, type_ = pair
+    try:
+        return extract_drucksache_content(druck_id, type_)
+    except Exception as e:
+        logger.error(f"Error extracting content from {druck_id}: {e}")
+        return None
+
+
+def extract_contents(
+    pairs: Iterable[tuple[str, str]],
+    workers: int | None = config.EXTRACTION_WORKERS,
+    chunksize: int = config.EXTRACTION_CHUNKSIZE,
+) -> list[str | None]:
+    """
+    Extracts the content of many drucksachen in parallel on a process pool.
+
+    Args:
+        pairs: (drucksache_id, type) pairs to extract.
+        workers: Number of worker processes, defaults to the number of cores.
+        chunksize: Number of documents handed to a worker at once.
+
+    Returns:
+        The extracted contents in the order of `pairs`, None where extraction failed.
+    """
+    pairs = list(pairs)
+    if workers == 1:
+        return [_extract_content_safe(pair) for pair in tqdm(pairs, unit="doc")]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(
+            tqdm(
+                pool.map(_extract_content_safe, pairs, chunksize=chunksize),
+                total=len(pairs),
+                unit="doc",
+            )
+        )
+
+
 def filter_votes_by_content(all_votes: pd.DataFrame) -> pd.DataFrame:
     before = len(all_votes)
-    all_votes = all_votes[
-        (
-            all_votes["content"].notna()
-            & all_votes["content"].str.len().lt(config.MAX_CONTENT_CHARS)
-        )
-    ]
+    all_votes = all_votes[all_votes["content"].notna()]
     after = len(all_votes)
-    logger.info(
-        f"Filtered {before - after} entries with too long content or no content"
-    )
+    logger.info(f"Filtered {before - after} entries without content")
     return all_votes
 
 
@@ -196,33 +343,123 @@ def is_own_proposal(row: pd.Series):
     return row["is_governing"] and "Bundesregierung" in row["proposers"]
 
 
-def build():
-    tqdm.pandas()
+def pipeline_version() -> str:
+    """
+    Hash of everything besides the drucksache itself that the derived columns of a
+    row depend on: prompts, models and the chunk size of long summaries.
+    """
+    parts = [
+        prompts.SUMMARIZE_DRUCKSACHE,
+        prompts.MERGE_SUMMARIES,
+        prompts.GET_PROPOSER,
+        config.SUMMARY_MODEL,
+        config.PROPOSER_MODEL,
+        config.EMBEDDING_MODEL,
+        str(config.SUMMARY_CHUNK_TOKENS),
+    ]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
 
-    entrypoints = build_entrypoints()
 
-    all_votes = combine_entrypoints_and_beschlussempfehlungen(entrypoints)
+def compute_fingerprints(all_votes: pd.DataFrame) -> pd.Series:
+    version = pipeline_version()
+
+    def fingerprint(row: pd.Series) -> str:
+        try:
+            drucksache_hash = get_drucksache_hash(row["drucksache_id"])
+        except Exception as e:
+            logger.error(f"Unable to hash {row['drucksache_id']}: {e}")
+            drucksache_hash = "missing"
+        parts = [version, drucksache_hash, row["type"], str(row["drucksache_title"])]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    return all_votes.apply(fingerprint, axis=1)
+
+
+def split_unchanged(all_votes: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Splits the votes into rows whose fingerprint matches a row of the existing output,
+    with the derived columns taken from there, and rows that have to be processed.
+    """
+    output_path = Path(config.OUTPUT_PARQUET_PATH)
+    if not output_path.exists():
+        return all_votes.iloc[0:0], all_votes
+    existing = pd.read_parquet(output_path)
+    if "fingerprint" not in existing.columns:
+        logger.info("Existing output has no fingerprints, rebuilding all rows.")
+        return all_votes.iloc[0:0], all_votes
+
+    keys = ["vote_id", "drucksache_id", "fingerprint"]
+    merged = all_votes.merge(
+        existing[keys + DERIVED_COLUMNS].drop_duplicates(subset=keys),
+        on=keys,
+        how="left",
+        indicator=True,
+    )
+    unchanged = merged["_merge"] == "both"
+    merged = merged.drop(columns="_merge")
+    return merged[unchanged], all_votes[~unchanged.values]
+
+
+def process_votes(all_votes: pd.DataFrame, use_batch: bool = False) -> pd.DataFrame:
     logger.info("Extracting content from drucksachen...")
+    contents = extract_contents(
+        zip(all_votes["drucksache_id"], all_votes["type"])
+    )
     all_votes["content"] = (
-        all_votes.progress_apply(extract_content, axis=1)
+        pd.Series(contents, index=all_votes.index, dtype="object")
         .str.replace(r"[\s\n]+", " ", regex=True)
         .str.strip()
     )
     all_votes = filter_votes_by_content(all_votes)
     logger.info("Summarizing texts...")
-    all_votes["summary"] = summarize_texts(all_votes["content"])
+    all_votes["summary"] = summarize_texts(all_votes["content"], use_batch)
     logger.info("Calculating embeddings for summaries...")
-    all_votes["summary_embedding"] = all_votes["summary"].progress_apply(
-        openai_client.get_embedding
+    all_votes["summary_embedding"] = embed_texts(
+        all_votes["summary"].tolist(), model=config.EMBEDDING_MODEL
     )
+    missing_summary = all_votes["summary_embedding"].isna()
+    if missing_summary.any():
+        logger.warning(f"Dropping {missing_summary.sum()} entries without summary")
+        all_votes = all_votes[~missing_summary]
+    logger.info("Extracting vote proposers...")
+    all_votes["proposers"] = resolve_proposers(all_votes["drucksache_title"])
+    all_votes["proposers"] = all_votes["proposers"].apply(clean_proposers)
+    return all_votes
+
+
+def build(incremental: bool = True, use_batch: bool = False, refresh: bool = False):
+    """
+    Builds `config.OUTPUT_PARQUET_PATH`. In incremental mode only rows whose
+    fingerprint changed or that are new are extracted, summarized, embedded and
+    assigned proposers, all other rows are taken from the existing output.
+    With `use_batch` the summaries are requested as a resumable batch job. With
+    `refresh` downloaded drucksachen are revalidated against the server, changed
+    ones get a new fingerprint and are processed again.
+    """
+    tqdm.pandas()
+
+    entrypoints = build_entrypoints()
+
+    all_votes = combine_entrypoints_and_beschlussempfehlungen(entrypoints)
     all_votes["date"] = pd.to_datetime(
         all_votes["vote_num"].str.split("_").str[0], format="%Y%m%d"
     )
-    logger.info("Extracting vote proposers...")
-    all_votes["proposers"] = all_votes["drucksache_title"].progress_apply(
-        openai_client.get_proposer
-    )
-    all_votes["proposers"] = all_votes["proposers"].apply(clean_proposers)
+    logger.info("Downloading drucksachen...")
+    download_drucksachen(all_votes["drucksache_id"], refresh=refresh)
+    all_votes["fingerprint"] = compute_fingerprints(all_votes)
+
+    if incremental:
+        unchanged, changed = split_unchanged(all_votes)
+    else:
+        unchanged, changed = all_votes.iloc[0:0], all_votes
+    logger.info(f"Reusing {len(unchanged)} unchanged rows, processing {len(changed)}.")
+
+    if not changed.empty:
+        changed = process_votes(changed.copy(), use_batch)
+    all_votes = pd.concat([unchanged, changed], ignore_index=True)
     logger.info("Saving data to parquet...")
     all_votes.drop(columns="vote_num", inplace=True)
-    all_votes.to_parquet(config.OUTPUT_PARQUET_PATH, index=False)
+    vectors.write_parquet(
+        all_votes, config.OUTPUT_PARQUET_PATH, embedding_columns=["summary_embedding"]
+    )
+    gateway.log_cache_stats()
@@ -1,12 +1,37 @@
+import os
+
 URLS_PARQUET_PATH = "data/votes/urls.parquet"
 RESULT_CSV_FOLDER = "data/votes/results"
+RESULTS_PARQUET_PATH = "data/votes/results.parquet"
+# number of buffered party results after which the result store is written
+RESULTS_FLUSH_EVERY = 500
 ENTRYPOINTS_PARQUET_PATH = "data/votes/entrypoints.parquet"
+ENTRYPOINT_CHECKPOINT_FOLDER = "data/votes/entrypoints"
+ENTRYPOINT_FAILURES_PATH = "data/votes/entrypoint_failures.parquet"
+# votes built concurrently and finished votes per checkpoint file
+ENTRYPOINT_WORKERS = 4
+ENTRYPOINT_CHECKPOINT_EVERY = 50
 OUTPUT_PARQUET_PATH = "output/votes.parquet"
 
-# deepseek context window is 64000 tokens, one character is about 0.3 tokens
-MAX_CONTENT_CHARS = 58000 * 3  #
+# "files" keeps every vote pdf in its own folder, "packed" stores them in one archive
+VOTE_STORAGE_BACKEND = "files"
+VOTES_PACKED_ARCHIVE_PATH = "data/votes/votes.pack"
+
+# drucksachen above this many tokens are summarized in chunks which are merged afterwards
+SUMMARY_CHUNK_TOKENS = 16_000
+
+# concurrent listing page requests and request rate when scraping vote urls
+SCRAPE_WORKERS = 4
+SCRAPE_REQUESTS_PER_SECOND = 2.0
+
+# worker processes and documents per task for the bulk pdf extraction
+EXTRACTION_WORKERS = os.cpu_count()
+EXTRACTION_CHUNKSIZE = 8
 
 EMBEDDING_MODEL = "text-embedding-3-small"
+SUMMARY_MODEL = "gpt-4.1-mini"
+PROPOSER_MODEL = "gpt-4.1-mini"
+ENTRYPOINT_MODEL = "gpt-4.1-mini"
 
 RELEVANT_TYPES = ["Gesetzentwurf", "Beschlussempfehlung", "Antrag", "Änderungsantrag"]
 
@@ -1,13 +1,16 @@
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 import pandas as pd
-import requests
 from bs4 import BeautifulSoup, ResultSet, Tag
 from loguru import logger
 from tqdm import tqdm
 
+from src import config as global_config
+from src.utils.download import get_session
+from src.utils.ratelimit import get_host_bucket
 from src.votes import config
 
 
@@ -16,7 +19,8 @@ def get_votes_tablerows(start_offset: int, limit: int = 30) -> ResultSet:
         "https://www.bundestag.de/ajax/filterlist/de/parlament/plenum/abstimmung/"
         f"liste/462112-462112?limit={limit}&noFilterSet=false&offset={start_offset}"
     )
-    response = requests.get(url)
+    get_host_bucket(url, config.SCRAPE_REQUESTS_PER_SECOND).acquire()
+    response = get_session().get(url, timeout=global_config.DOWNLOAD_TIMEOUT)
     response.raise_for_status()
     soup = BeautifulSoup(response.text, "html.parser")
     # first row is the table header, so skip it
@@ -51,38 +55,95 @@ def parse_vote_row(vote_element: Tag) -> dict:
     }
 
 
-def scrape_urls(limit: int = 30, sleep_duration: float = 0.5) -> list[dict]:
-    if Path(config.URLS_PARQUET_PATH).exists():
+def parse_page(votes: ResultSet, offset: int) -> list[dict]:
+    data = []
+    for idx, vote in enumerate(votes):
+        try:
+            data.append(parse_vote_row(vote))
+        except Exception as e:
+            logger.error(f"Unable to parse vote at offset {offset + idx} due to {e}")
+    return data
+
+
+def scrape_pages(
+    limit: int,
+    workers: int,
+    stop: Callable[[list[dict]], bool] = lambda page: False,
+) -> list[dict]:
+    """
+    Walks the vote listing from the newest entry on. Pages are requested in waves
+    that start with a single page and double up to `workers` concurrent requests.
+
+    Args:
+        limit: Number of votes per listing page.
+        workers: Maximum number of pages requested concurrently.
+        stop: Called with every parsed page; scraping ends after the first page for
+            which it returns True.
+
+    Returns:
+        The parsed vote rows in listing order.
+    """
+    data = []
+    offset = 0
+    wave = 1
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        tqdm(desc="Scraping vote metadata", unit="vote") as pbar,
+    ):
+        while True:
+            offsets = [offset + i * limit for i in range(wave)]
+            pages = pool.map(lambda o: get_votes_tablerows(o, limit=limit), offsets)
+            for page_offset, votes in zip(offsets, pages):
+                if not votes or len(votes) < limit:
+                    return data
+                page = parse_page(votes, page_offset)
+                data.extend(page)
+                pbar.update(limit)
+                if stop(page):
+                    return data
+            offset += wave * limit
+            wave = min(wave * 2, workers)
+
+
+def scrape_urls(
+    limit: int = 30,
+    workers: int = config.SCRAPE_WORKERS,
+    incremental: bool = True,
+) -> None:
+    """
+    Scrapes the urls of all votes into `config.URLS_PARQUET_PATH`. If the file
+    already exists and `incremental` is set, only votes newer than the known ones
+    are fetched and appended with new vote ids; existing vote ids never change.
+    """
+    urls_path = Path(config.URLS_PARQUET_PATH)
+    if urls_path.exists() and not incremental:
         logger.info("Vote metadata already exists. Skipping scraping.")
         return
     Path("data/votes/").mkdir(parents=True, exist_ok=True)
-    logger.info("Gathering vote metadata from Bundestag website...")
-    data = []
-    current_offset = 0
-
-    with tqdm(desc="Scraping vote metadata", unit="vote") as pbar:
-        while True:
-            votes = get_votes_tablerows(current_offset, limit=limit)
-
-            if not votes or len(votes) < limit:
-                break
-
-            current_offset += limit
-            pbar.update(limit)
-
-            time.sleep(sleep_duration)
 
-            for idx, vote in enumerate(votes):
-                try:
-                    vote_data = parse_vote_row(vote)
-                    data.append(vote_data)
-                except Exception as e:
-                    logger.error(
-                        f"Unable to parse vote at offset {current_offset + idx} due to {e}"
-                    )
+    existing = pd.read_parquet(urls_path) if urls_path.exists() else None
+    if existing is None:
+        logger.info("Gathering vote metadata from Bundestag website...")
+        data = scrape_pages(limit, workers)
+    else:
+        logger.info("Gathering new vote metadata from Bundestag website...")
+        known = set(existing["vote_num"])
+        data = scrape_pages(
+            limit, workers, stop=lambda page: any(v["vote_num"] in known for v in page)
+        )
 
     logger.info(f"Gathered {len(data)} votes.")
-    urls = pd.DataFrame(data)
+    urls = pd.DataFrame(data, columns=["vote_num", "xls_url", "pdf_url"])
     urls.drop_duplicates(subset=["vote_num", "xls_url", "pdf_url"], inplace=True)
-    urls = urls.reset_index(names="vote_id")
+    if existing is None:
+        urls = urls.reset_index(names="vote_id")
+    else:
+        urls = urls[~urls["vote_num"].isin(existing["vote_num"])]
+        if urls.empty:
+            logger.info("No new votes found.")
+            return
+        logger.info(f"Adding {len(urls)} new votes.")
+        first_id = existing["vote_id"].max() + 1
+        urls.insert(0, "vote_id", range(first_id, first_id + len(urls)))
+        urls = pd.concat([existing, urls], ignore_index=True)
     urls.to_parquet(config.URLS_PARQUET_PATH, index=False)
@@ -3,8 +3,11 @@ from typing import TypedDict
 import pandas as pd
 from loguru import logger
 
-from src.utils.llm import openai_client
+from src.enums import APIProviderEnum
+from src.utils.llm import gateway, prompts
+from src.utils.llm.schemas import MatchingTitle
 from src.utils.regex import regex_drucksachen_type
+from src.votes import config
 
 
 class EntrypointDict(TypedDict):
@@ -42,8 +45,13 @@ def get_entrypoint(
                 f"No drucksachen of type {vote_type} found for vote {vote_title}. Using all available drucksachen."
             )
 
-        match = openai_client.match_drucksache_to_vote(
-            vote_title, available_drucksachen if same_type.empty else same_type
+        candidates = available_drucksachen if same_type.empty else same_type
+        match = gateway.parse(
+            APIProviderEnum.OPENAI,
+            config.ENTRYPOINT_MODEL,
+            system_prompt=prompts.MATCH_ENTRYPOINT,
+            text=f"Vote title: {vote_title}\nAvailable drucksachen: {candidates}",
+            schema=MatchingTitle,
         )
         matched_drucksache = drucksachen_for_this_vote.iloc[match.index]
     return {
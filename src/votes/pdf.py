@@ -1,35 +1,68 @@
+from functools import cache
 from pathlib import Path
 
 import pandas as pd
 from loguru import logger
 
 from src.utils import pdf
-from src.utils.download import download_file
+from src.utils.archive import PackedArchive
+from src.utils.download import download_file, ensure_validated
+from src.votes import config
+
+
+@cache
+def get_archive() -> PackedArchive:
+    return PackedArchive(config.VOTES_PACKED_ARCHIVE_PATH)
 
 
 def get_vote_path(vote_id: str) -> str:
     return f"data/votes/all/{vote_id}/result.pdf"
 
 
-def assert_vote_download(vote: pd.Series):
-    filename = get_vote_path(vote["id"])
-    Path(f"data/votes/pdf/{vote['id']}").mkdir(parents=True, exist_ok=True)
-    if Path(filename).exists():
+def is_vote_downloaded(vote_id: str) -> bool:
+    if config.VOTE_STORAGE_BACKEND == "packed":
+        return str(vote_id) in get_archive()
+    return Path(get_vote_path(vote_id)).exists()
+
+
+def download_vote_pdf(vote_id: str, pdf_url: str) -> None:
+    filename = get_vote_path(vote_id)
+    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+    if is_vote_downloaded(vote_id):
         return
-    download_file(vote["pdf_url"], filename)
+    download_file(pdf_url, filename)
     try:
-        pdf.extract_content(filename)
+        ensure_validated(filename)
     except Exception as e:
         logger.error(f"File {filename} corrupted: {e}")
         Path(filename).unlink(missing_ok=True)
         raise e
+    if config.VOTE_STORAGE_BACKEND == "packed":
+        get_archive().add(str(vote_id), Path(filename).read_bytes())
+        Path(filename).unlink()
+
+
+def assert_vote_download(vote: pd.Series):
+    download_vote_pdf(vote["id"], vote["pdf_url"])
+
+
+def import_vote_files() -> int:
+    """
+    Imports the per-vote pdf files in `data/votes/all` into the packed archive.
+    """
+    return get_archive().import_directory(
+        "data/votes/all", pattern="*/result.pdf", key_from_path=lambda p: p.parent.name
+    )
 
 
 def get_vote(vote_id: str, opt="text", first_page_only=False) -> str:
-    filename = get_vote_path(vote_id)
-    if not Path(filename).exists():
+    if not is_vote_downloaded(vote_id):
         raise FileNotFoundError(f"Vote {vote_id} not found. Please download it first.")
+    if config.VOTE_STORAGE_BACKEND == "packed":
+        source = get_archive().get(str(vote_id))
+    else:
+        source = get_vote_path(vote_id)
 
     if first_page_only:
-        return pdf.extract_first_page(filename, opt)
-    return pdf.extract_content(filename, opt)
+        return pdf.read_first_page(source, opt)
+    return pdf.read_content(source, opt)
@@ -0,0 +1,131 @@
+import re
+
+import pandas as pd
+from loguru import logger
+from tqdm import tqdm
+
+from src.utils import regex
+from src.enums import APIProviderEnum
+from src.utils.llm import gateway, prompts
+from src.utils.llm.schemas import VoteProposers
+from src.votes import config
+
+# spellings of the proposers in config.PROPOSERS that differ from their key
+PROPOSER_ALIASES = {
+    "Union (CDU/CSU)": ["CDU/CSU"],
+    "BÜNDNIS 90/DIE GRÜNEN": ["BÜNDNIS 90 / DIE GRÜNEN", "BÜNDNIS 90/ DIE GRÜNEN"],
+    "DIE LINKE": ["DIE LINKE.", "Die Linke"],
+    "Bundesrat": ["Bundesrates"],
+}
+
+_ALIASES = sorted(
+    (
+        (alias, proposer)
+        for proposer in config.PROPOSERS
+        for alias in [proposer, *PROPOSER_ALIASES.get(proposer, [])]
+    ),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+# aliases may end in a dot ("DIE LINKE."), so the boundary is a lookahead, not \b
+_ALIAS_PATTERN = re.compile(
+    rf"(?:{'|'.join(re.escape(alias) for alias, _ in _ALIASES)})(?!\w)"
+)
+_ALIAS_LOOKUP = dict(_ALIASES)
+
+_INTRO_PATTERN = re.compile(
+    rf"^(?:(?:{'|'.join(map(re.escape, regex.COUNTS))})\s)?"
+    rf"(?:{'|'.join(map(re.escape, regex.TYPES))})\s+(?:der|des)\s+"
+)
+_GROUP_PATTERN = re.compile(r"\b(?:der\s+)?(?:Fraktion|Fraktionen|Gruppe|Gruppen)\s+(?:der\s+)?")
+_SEPARATOR_PATTERN = re.compile(r"\s*(?:,|\bund\b)\s*(?:der\s+)?")
+# joins a further group of proposers, e.g. "sowie der Abgeordneten ... und der Fraktion"
+_CONTINUATION_PATTERN = re.compile(r"\s*(?:,|\bsowie\b|\bund\b)\s*(?:der\s+)?")
+
+
+def _parse_proposer_list(text: str, pos: int = 0) -> tuple[list[str], int]:
+    # reads "SPD, BÜNDNIS 90/DIE GRÜNEN und der FDP" from text[pos:] and returns the
+    # proposers and the position after the last one
+    proposers, end = [], pos
+    while True:
+        match = _ALIAS_PATTERN.match(text, pos)
+        if not match:
+            return proposers, end
+        proposers.append(_ALIAS_LOOKUP[match.group(0)])
+        end = match.end()
+        separator = _SEPARATOR_PATTERN.match(text, end)
+        if not separator:
+            return proposers, end
+        pos = separator.end()
+
+
+def _find_group(clause: str, pos: int) -> re.Match | None:
+    # "Abgeordneten ..." lists members before naming their group
+    if clause.startswith("Abgeordneten", pos):
+        return _GROUP_PATTERN.search(clause, pos)
+    return _GROUP_PATTERN.match(clause, pos)
+
+
+def match_proposers(title: str) -> list[str] | None:
+    """
+    Resolves the proposers of a drucksache from the fixed forms its title uses,
+    e.g. "Gesetzentwurf der Bundesregierung" or "Antrag der Abgeordneten ... und der
+    Fraktion der SPD".
+
+    Returns:
+        The proposers as keys of `config.PROPOSERS`, or None if the title does not
+        follow one of the known forms.
+    """
+    title = re.sub(r"\s+", " ", title).strip()
+    intro = _INTRO_PATTERN.match(title)
+    if not intro:
+        return None
+    clause = title[intro.end() :]
+    if clause.startswith("Bundesregierung"):
+        return ["Bundesregierung"]
+    if clause.startswith("Bundesrates"):
+        return ["Bundesrat"]
+    proposers, pos = [], 0
+    while True:
+        group = _find_group(clause, pos)
+        if not group:
+            return None
+        parsed, pos = _parse_proposer_list(clause, group.end())
+        if not parsed:
+            return None
+        proposers.extend(parsed)
+        continuation = _CONTINUATION_PATTERN.match(clause, pos)
+        if not continuation:
+            return list(dict.fromkeys(proposers))
+        # a further group follows; anything else after a joining word is a form
+        # this matcher does not know, which is left to the llm
+        pos = continuation.end()
+
+
+def llm_proposers(title: str) -> list[str]:
+    return gateway.parse(
+        APIProviderEnum.OPENAI,
+        config.PROPOSER_MODEL,
+        system_prompt=prompts.GET_PROPOSER,
+        text=f"Vote title: {title}",
+        schema=VoteProposers,
+    ).proposers
+
+
+def resolve_proposers(titles: pd.Series) -> pd.Series:
+    """
+    Resolves the proposers of every title, locally where the title follows a known
+    form and through the llm otherwise, whose answers are cached by the gateway.
+    """
+    matched = titles.apply(match_proposers)
+    logger.info(
+        f"Resolved proposers of {matched.notna().sum()} of {len(titles)} titles locally."
+    )
+    return pd.Series(
+        [
+            match if match is not None else llm_proposers(title)
+            for title, match in tqdm(zip(titles, matched), total=len(titles), unit="title")
+        ],
+        index=titles.index,
+        dtype="object",
+    )
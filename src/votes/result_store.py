@@ -0,0 +1,114 @@
+import os
+import threading
+from functools import cache
+from pathlib import Path
+
+import pandas as pd
+from loguru import logger
+
+from src.enums import VoteResultEnum
+from src.utils.locking import file_lock
+from src.votes import config
+
+RESULT_COLUMNS = [
+    VoteResultEnum.ANNAHME.value,
+    VoteResultEnum.ABLEHNUNG.value,
+    VoteResultEnum.ENTHALTUNG.value,
+]
+COLUMNS = ["party", "vote_id", *RESULT_COLUMNS]
+
+
+class VoteResultStore:
+    """
+    Vote results of every party, persisted as one parquet table with the columns
+    party, vote_id, Annahme, Ablehnung and Enthaltung.
+
+    The (party, vote_id) pairs are indexed in memory, new rows are buffered and
+    written in batches. Writes merge with the table on disk under a file lock, so
+    several workers can share the store. If the table does not exist yet, the
+    per-party CSVs of the previous layout are imported.
+    """
+
+    def __init__(
+        self,
+        path: str = config.RESULTS_PARQUET_PATH,
+        legacy_csv_folder: str = config.RESULT_CSV_FOLDER,
+        flush_every: int = config.RESULTS_FLUSH_EVERY,
+    ):
+        self.path = Path(path)
+        self.legacy_csv_folder = Path(legacy_csv_folder)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending: list[dict] = []
+        results = self._read()
+        self._index = set(zip(results["party"], results["vote_id"]))
+
+    def _read(self) -> pd.DataFrame:
+        if self.path.exists():
+            return pd.read_parquet(self.path)
+        frames = [
+            pd.read_csv(csv_path).assign(party=csv_path.stem)
+            for csv_path in sorted(self.legacy_csv_folder.glob("*.csv"))
+        ]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        logger.info(f"Importing vote results from {self.legacy_csv_folder}.")
+        return pd.concat(frames, ignore_index=True)[COLUMNS]
+
+    def __contains__(self, key: tuple[str, int]) -> bool:
+        return key in self._index
+
+    def add(self, vote_id: int, by_party: pd.DataFrame) -> None:
+        """
+        Buffers the results of a vote. Parties that already have a result for the
+        vote are skipped.
+
+        Args:
+            vote_id: ID of the vote.
+            by_party: Result counts indexed by party.
+        """
+        with self._lock:
+            for party, counts in by_party[RESULT_COLUMNS].iterrows():
+                if (party, vote_id) in self._index:
+                    continue
+                self._index.add((party, vote_id))
+                self._pending.append(
+                    {"party": party, "vote_id": vote_id, **counts.to_dict()}
+                )
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(f"{self.path}.lock"):
+                results = pd.concat(
+                    [self._read(), pd.DataFrame(self._pending, columns=COLUMNS)],
+                    ignore_index=True,
+                ).drop_duplicates(subset=["party", "vote_id"], keep="first")
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                results.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, self.path)
+            self._index.update(zip(results["party"], results["vote_id"]))
+            self._pending = []
+
+    def load(self, party: str | None = None) -> pd.DataFrame:
+        """
+        Returns the stored results, optionally only those of one party.
+        """
+        self.flush()
+        results = self._read()
+        if party is not None:
+            results = results[results["party"] == party]
+        return results.reset_index(drop=True)
+
+    def parties(self) -> set[str]:
+        return {party for party, _ in self._index}
+
+
+@cache
+def get_result_store() -> VoteResultStore:
+    return VoteResultStore()
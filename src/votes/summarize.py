@@ -1,36 +1,18 @@
-import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Iterable
-
 import pandas as pd
-from loguru import logger
-from tqdm import tqdm
 
-from src.utils.llm import deepseek_client, openai_client
+from src.enums import APIProviderEnum
+from src.utils.llm.mapreduce import summarize_long
 from src.utils.llm.prompts import SUMMARIZE_DRUCKSACHE
-
-
-def process(idx: int, text: str) -> tuple[int, str | None]:
-    try:
-        return idx, openai_client.prompt_openai(
-            system_prompt=SUMMARIZE_DRUCKSACHE,
-            text=text,
-        )
-    except Exception:
-        traceback.print_exc()
-        return idx, None
-
-
-def summarize_texts(content: pd.Series) -> list[str | None]:
-    summarizations = [None] * len(content)
-
-    with ThreadPoolExecutor(max_workers=2) as pool, tqdm(total=len(content)) as pbar:
-        futures = [
-            pool.submit(process, i, content) for i, content in enumerate(content)
-        ]
-        for future in as_completed(futures):
-            i, summary = future.result()
-            summarizations[i] = summary
-            pbar.update(1)
-
-    return summarizations
+from src.votes import config
+
+
+def summarize_texts(content: pd.Series, use_batch: bool = False) -> list[str | None]:
+    return summarize_long(
+        list(content),
+        APIProviderEnum.OPENAI,
+        config.SUMMARY_MODEL,
+        SUMMARIZE_DRUCKSACHE,
+        max_tokens=config.SUMMARY_CHUNK_TOKENS,
+        use_batch=use_batch,
+        prefix="summaries",
+    )